@@ -0,0 +1,158 @@
+"""
+Results store benchmark
+Fills a temporary ResultsStore through its write-behind queue, then times
+record() as seen by the request thread, sustained write throughput, and
+each /results query shape against the full table. Queries run on the
+benchmark thread and, like the threaded server's requests, on a new
+thread each. Every query plan is checked for full table scans, which
+would not survive millions of rows.
+
+Usage:
+    python benchmarks/bench_results.py [--rows 1000000] [--output results.json]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+from common import summarize, write_report
+from results_store import RISK_LEVELS, ResultsStore
+
+
+def synthetic_results(count, clinics, seed=0):
+    rng = random.Random(seed)
+    for _ in range(count):
+        probability = rng.random()
+        risk_level = RISK_LEVELS[min(2, int(probability / 0.34))]
+        yield (
+            {
+                'probability': probability,
+                'riskLevel': risk_level,
+                'classification': 'TB Positive' if risk_level == 'high' else 'TB Negative',
+                'urgency_level': 'routine',
+                'affected_regions': ['right upper lobe'] if risk_level == 'high' else [],
+                'model_version': 'bench',
+            },
+            f'{rng.getrandbits(256):064x}',
+            f'clinic-{rng.randrange(clinics)}',
+        )
+
+
+def time_calls(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def in_new_thread(fn):
+    """fn run on a fresh thread per call, as the server runs each request"""
+    def run():
+        thread = threading.Thread(target=fn)
+        thread.start()
+        thread.join()
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--clinics', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--repeats', type=int, default=50)
+    parser.add_argument('--db', help="store location (default: temporary directory)")
+    parser.add_argument('--output', help="write JSON results to this file")
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix='drishti-results-'), 'results.db')
+    # No heatmaps here, so lift the byte budget enough to queue every row
+    store = ResultsStore(db_path, batch_size=args.batch_size,
+                         max_queue_bytes=(args.rows + 1) * 2048)
+
+    now = time.time()
+    span = 365 * 24 * 3600
+    record_samples = []
+    hashes = []
+    fill_started = time.perf_counter()
+    for result, image_hash, clinic_id in synthetic_results(args.rows, args.clinics):
+        start = time.perf_counter()
+        store.record(result, image_hash, clinic_id=clinic_id)
+        record_samples.append(time.perf_counter() - start)
+        if len(hashes) < args.repeats:
+            hashes.append(image_hash)
+    store.flush()
+    fill_seconds = time.perf_counter() - fill_started
+
+    # record() stamps "now"; spread the rows over the last year instead so
+    # time-range queries are meaningful
+    conn = store._connect()
+    with conn:
+        conn.execute("UPDATE results SET created_at = ? - (? - id) * ?",
+                     (now, args.rows, span / args.rows))
+
+    month = 30 * 24 * 3600
+    middle = now - span / 2
+    queries = {
+        'latest_page': {},
+        'time_range_month': {'start': middle, 'end': middle + month},
+        'risk_high': {'risk_level': 'high'},
+        'risk_high_in_month': {'risk_level': 'high', 'start': middle, 'end': middle + month},
+        'clinic_in_month': {'clinic_id': 'clinic-7', 'start': middle, 'end': middle + month},
+    }
+    query_results = {}
+    for name, filters in queries.items():
+        query = lambda: store.query(limit=50, **filters)  # noqa: E731
+        query_results[name] = time_calls(query, args.repeats)
+        query_results[f'{name}_new_thread'] = time_calls(in_new_thread(query), args.repeats)
+
+    hash_iter = iter(hashes * 2)
+    query_results['image_hash'] = time_calls(
+        lambda: store.query(image_sha256=next(hash_iter)), args.repeats
+    )
+
+    # Follow the cursor 100 pages deep: cost must not grow with depth
+    _, cursor = store.query(limit=50)
+    for _ in range(99):
+        _, cursor = store.query(limit=50, cursor=cursor)
+    query_results['page_100'] = time_calls(lambda: store.query(limit=50, cursor=cursor), args.repeats)
+
+    plans = {}
+    for name, sql in (
+        ('risk_high_in_month',
+         "SELECT * FROM results WHERE risk_level = 'high' AND created_at >= 0 "
+         "ORDER BY created_at DESC, id DESC LIMIT 51"),
+        ('image_hash',
+         "SELECT * FROM results WHERE image_sha256 = 'x' ORDER BY created_at DESC, id DESC LIMIT 51"),
+        ('cursor',
+         "SELECT * FROM results WHERE (created_at, id) < (1, 1) "
+         "ORDER BY created_at DESC, id DESC LIMIT 51"),
+    ):
+        plans[name] = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+    conn.close()
+    store.close()
+
+    full_scans = [name for name, plan in plans.items()
+                  if any(step.startswith('SCAN results') and 'INDEX' not in step for step in plan)]
+    report = {
+        'benchmark': 'results_store',
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'params': vars(args),
+        'record_call': summarize(record_samples),
+        'fill_seconds': round(fill_seconds, 2),
+        'write_rows_per_second': round(args.rows / fill_seconds),
+        'dropped': store.stats['dropped'],
+        'db_size_mb': round(os.path.getsize(db_path) / (1024 * 1024), 1),
+        'queries': query_results,
+        'plans': plans,
+        'full_scans': full_scans,
+    }
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
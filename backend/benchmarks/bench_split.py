@@ -0,0 +1,66 @@
+"""
+In-process vs split-process serving benchmark
+Starts server.py (model inside the Flask process) and serve_split.py
+(front-ends + model owner over the shared-memory ring) on free ports and
+drives both with the same concurrent /predict load.
+
+Usage:
+    python benchmarks/bench_split.py [--requests 64] [--concurrency 8]
+                                     [--frontends 4] [--random-weights]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from common import (
+    ServerProcess, drive_load, encode_image, random_weight_registry, synthetic_xray,
+    write_report
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=64)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--frontends', type=int, default=4)
+    parser.add_argument('--max-batch', type=int, default=8)
+    parser.add_argument('--image-size', type=int, default=2048)
+    parser.add_argument('--random-weights', action='store_true',
+                        help="use a temporary registry with untrained weights")
+    parser.add_argument('--output', help="write JSON results to this file")
+    parser.add_argument('--server-log', help="write server output to <name>.<config>.log")
+    args = parser.parse_args()
+
+    env = {}
+    if args.random_weights:
+        env['DRISHTI_MODEL_REGISTRY'] = str(random_weight_registry())
+
+    images = [encode_image(synthetic_xray(args.image_size, seed=i)) for i in range(4)]
+
+    configs = {
+        'in_process': ['server.py'],
+        'split': ['serve_split.py', '--frontends', str(args.frontends),
+                  '--max-batch', str(args.max_batch)],
+    }
+    report = {
+        'benchmark': 'split_vs_in_process',
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'cpu_count': os.cpu_count(),
+        'params': vars(args),
+        'results': {},
+    }
+    for name, server_args in configs.items():
+        print(f"Running {name}...", file=sys.stderr)
+        log_path = f"{args.server_log}.{name}.log" if args.server_log else None
+        with ServerProcess(server_args, env=env, log_path=log_path) as server:
+            result = drive_load(server.url, images, args.requests, args.concurrency)
+            result['startup_seconds'] = round(server.startup_seconds, 2)
+        report['results'][name] = result
+
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
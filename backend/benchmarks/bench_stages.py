@@ -0,0 +1,156 @@
+"""
+Per-stage micro-benchmarks for /predict
+Times every stage of the request pipeline in isolation on synthetic X-rays,
+in the order predict() runs them:
+
+  decode        uploads.open_xray on the encoded upload
+  preprocess    pipeline.preprocess_image
+  forward       TBClassifier forward pass under no_grad (per batch size)
+  generate_cam  GradCAMPlusPlus.generate_cam (per batch size)
+  segment_lungs pipeline.segment_lungs
+  mask_render   pipeline.mask_cam + pipeline.render_heatmap
+  detect        pipeline.detect_regions
+  encode_png    pipeline.encode_png + base64 for heatmap and overlay
+
+Usage:
+    python benchmarks/bench_stages.py [--repeats 20] [--batch-sizes 1,4]
+                                      [--random-weights] [--output stages.json]
+"""
+
+import argparse
+import base64
+import io
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+
+from common import encode_image, random_weight_registry, summarize, synthetic_xray, write_report
+from model_registry import ModelRegistry
+from tb_model import GradCAMPlusPlus, warmup_model
+from uploads import open_xray
+from pipeline import (
+    preprocess_image, segment_lungs, mask_cam, render_heatmap, detect_regions,
+    encode_png
+)
+
+
+def time_stage(fn, repeats, warmup):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--model-repeats', type=int, default=None,
+                        help="repeats for forward/generate_cam (default: --repeats)")
+    parser.add_argument('--batch-sizes', default='1',
+                        help="comma-separated batch sizes for the model stages")
+    parser.add_argument('--image-size', type=int, default=2048)
+    parser.add_argument('--format', default='JPEG', choices=['JPEG', 'PNG'])
+    parser.add_argument('--threads', type=int, default=None, help="torch intra-op threads")
+    parser.add_argument('--version', default=None, help="model registry version")
+    parser.add_argument('--random-weights', action='store_true',
+                        help="use a temporary registry with untrained weights")
+    parser.add_argument('--output', help="write JSON results to this file")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    registry = ModelRegistry(random_weight_registry()) if args.random_weights else ModelRegistry()
+    version = args.version or registry.default_version()
+    print(f"Loading {version} on {device}...", file=sys.stderr)
+    model = registry.load(version, device)
+    warmup_model(model, device)
+    gradcam = GradCAMPlusPlus(model, model.backbone.features[-1])
+
+    upload = encode_image(synthetic_xray(args.image_size), fmt=args.format)
+    img, _ = open_xray(io.BytesIO(upload))
+    img_array = preprocess_image(img)
+    original_img_np = (img_array * 255).astype(np.uint8)
+    img_tensor = torch.from_numpy(img_array).permute(2, 0, 1).unsqueeze(0).to(device)
+
+    cam_np = gradcam.generate_cam(img_tensor.clone().requires_grad_(True)).squeeze().cpu().numpy()
+    lung_mask = segment_lungs(original_img_np)
+    cam_masked = mask_cam(cam_np, lung_mask)
+    heatmap_rgb, overlay = render_heatmap(cam_masked, original_img_np)
+
+    stages = {
+        'decode': lambda: open_xray(io.BytesIO(upload))[0].close(),
+        'preprocess': lambda: preprocess_image(img),
+    }
+    model_repeats = args.model_repeats or args.repeats
+    batch_sizes = [int(b) for b in args.batch_sizes.split(',')]
+    model_stages = {}
+    for batch_size in batch_sizes:
+        batch = img_tensor.repeat(batch_size, 1, 1, 1)
+
+        def forward(batch=batch):
+            with torch.no_grad():
+                model(batch)
+
+        def generate_cam(batch=batch):
+            gradcam.generate_cam(batch.clone().requires_grad_(True))
+
+        model_stages[f'forward_b{batch_size}'] = (forward, batch_size)
+        model_stages[f'generate_cam_b{batch_size}'] = (generate_cam, batch_size)
+
+    post_stages = {
+        'segment_lungs': lambda: segment_lungs(original_img_np),
+        'mask_render': lambda: render_heatmap(mask_cam(cam_np, lung_mask), original_img_np),
+        'detect': lambda: detect_regions(cam_masked),
+        'encode_png': lambda: [
+            base64.b64encode(encode_png(image)).decode('utf-8') for image in (heatmap_rgb, overlay)
+        ],
+    }
+
+    results = {}
+    for name, fn in stages.items():
+        print(f"  {name}...", file=sys.stderr)
+        results[name] = summarize(time_stage(fn, args.repeats, args.warmup))
+    for name, (fn, batch_size) in model_stages.items():
+        print(f"  {name}...", file=sys.stderr)
+        result = summarize(time_stage(fn, model_repeats, args.warmup))
+        result['batch_size'] = batch_size
+        result['per_image_mean_ms'] = round(result['mean_ms'] / batch_size, 2)
+        results[name] = result
+    for name, fn in post_stages.items():
+        print(f"  {name}...", file=sys.stderr)
+        results[name] = summarize(time_stage(fn, args.repeats, args.warmup))
+
+    gradcam.remove()
+
+    # Sequential cost of one TB-positive request with pacing off
+    single = ['decode', 'preprocess', 'forward_b1', 'generate_cam_b1', 'segment_lungs',
+              'mask_render', 'detect', 'encode_png']
+    report = {
+        'benchmark': 'stages',
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'cpu_count': os.cpu_count(),
+        'torch_threads': torch.get_num_threads(),
+        'device': str(device),
+        'model_version': version,
+        'params': vars(args),
+        'stages': results,
+    }
+    if 1 in batch_sizes:
+        report['positive_request_estimate_ms'] = round(
+            sum(results[name]['mean_ms'] for name in single), 2
+        )
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Cold-start benchmark for the TB detection server
+Measures, in fresh interpreters:
+  - `import server` (must stay light: no torch/cv2/numpy at module level)
+  - the heavy stack the background loader pulls in (torch, torchvision, cv2)
+  - time until /health answers (port bound) and until it reports ready,
+    together with the import/load/warm-up timings the server reports
+
+Budgets turn it into a regression check: the exit code is 1 when a median
+exceeds --max-import-seconds / --max-bind-seconds / --max-ready-seconds.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 3] [--random-weights]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from common import BACKEND_DIR, ServerProcess, random_weight_registry, write_report
+
+_TIMED_IMPORT = (
+    "import sys, time; t = time.perf_counter(); import {module}; "
+    "print(time.perf_counter() - t); "
+    "print(int(any(m in sys.modules for m in ('torch', 'cv2', 'numpy'))))"
+)
+
+
+def time_import(module):
+    """Returns (seconds, pulled_in_heavy_modules) for a fresh interpreter"""
+    result = subprocess.run(
+        [sys.executable, '-c', _TIMED_IMPORT.format(module=module)],
+        cwd=str(BACKEND_DIR), capture_output=True, text=True, check=True
+    )
+    seconds, heavy = result.stdout.split()
+    return float(seconds), bool(int(heavy))
+
+
+def median(values):
+    values = [v for v in values if v is not None]
+    return round(statistics.median(values), 3) if values else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--random-weights', action='store_true',
+                        help="use a temporary registry with untrained weights")
+    parser.add_argument('--max-import-seconds', type=float, default=None)
+    parser.add_argument('--max-bind-seconds', type=float, default=None)
+    parser.add_argument('--max-ready-seconds', type=float, default=None)
+    parser.add_argument('--output', help="write JSON results to this file")
+    args = parser.parse_args()
+
+    env = {}
+    if args.random_weights:
+        env['DRISHTI_MODEL_REGISTRY'] = str(random_weight_registry())
+
+    runs = []
+    for i in range(args.runs):
+        print(f"Run {i + 1}/{args.runs}...", file=sys.stderr)
+        server_import, heavy = time_import('server')
+        stack_import, _ = time_import('pipeline, tb_model')
+        with ServerProcess(['server.py'], env=env) as server:
+            reported = server.health.get('timings', {})
+        runs.append({
+            'server_import_seconds': round(server_import, 3),
+            'server_import_pulls_heavy_modules': heavy,
+            'heavy_stack_import_seconds': round(stack_import, 3),
+            'bind_seconds': round(server.bind_seconds, 3),
+            'ready_seconds': round(server.startup_seconds, 3),
+            'reported': reported,
+        })
+
+    summary = {
+        key: median([run[key] for run in runs])
+        for key in ('server_import_seconds', 'heavy_stack_import_seconds',
+                    'bind_seconds', 'ready_seconds')
+    }
+    for key in ('import_seconds', 'load_seconds', 'warmup_seconds'):
+        summary[f'reported_{key}'] = median([run['reported'].get(key) for run in runs])
+
+    budgets = {
+        'server_import_seconds': args.max_import_seconds,
+        'bind_seconds': args.max_bind_seconds,
+        'ready_seconds': args.max_ready_seconds,
+    }
+    violations = [
+        f"{key} {summary[key]}s > {limit}s"
+        for key, limit in budgets.items()
+        if limit is not None and summary[key] is not None and summary[key] > limit
+    ]
+    if any(run['server_import_pulls_heavy_modules'] for run in runs):
+        violations.append("`import server` pulls in torch/cv2/numpy")
+
+    report = {
+        'benchmark': 'startup',
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'cpu_count': os.cpu_count(),
+        'params': vars(args),
+        'summary': summary,
+        'runs': runs,
+        'violations': violations,
+    }
+    write_report(report, args.output)
+    sys.exit(1 if violations else 0)
+
+
+if __name__ == "__main__":
+    main()
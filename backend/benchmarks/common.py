@@ -0,0 +1,206 @@
+"""
+Shared helpers for the backend benchmarks
+Server subprocess management, load driving, reporting and a small
+dependency-free multipart HTTP client.
+"""
+
+import atexit
+import io
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from synthetic import synthetic_xray  # noqa: E402,F401 - re-exported for the benchmarks
+
+
+def encode_image(img, fmt='JPEG', quality=92):
+    buffer = io.BytesIO()
+    img.save(buffer, format=fmt, quality=quality)
+    return buffer.getvalue()
+
+
+def percentiles(samples, points=(50, 95, 99)):
+    if not samples:
+        return {f'p{p}': None for p in points}
+    values = np.percentile(np.asarray(samples) * 1000.0, points)
+    return {f'p{p}': round(float(v), 2) for p, v in zip(points, values)}
+
+
+def summarize(samples):
+    """Mean/min plus percentiles in milliseconds for a list of seconds"""
+    if not samples:
+        return {'n': 0, 'mean_ms': None, 'min_ms': None, **percentiles(samples)}
+    return {
+        'n': len(samples),
+        'mean_ms': round(float(np.mean(samples)) * 1000.0, 2),
+        'min_ms': round(float(np.min(samples)) * 1000.0, 2),
+        **percentiles(samples),
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _error_body(e):
+    """JSON body of an HTTPError, or {} for HTML/plain error pages
+    (proxy 502/504, a 404 from pointing --url at the wrong place)"""
+    try:
+        return json.loads(e.read() or b'{}')
+    except ValueError:
+        return {}
+
+
+def post_image(url, image_bytes, filename='xray.jpg', timeout=300):
+    """POST multipart/form-data with an 'image' field, returns (status, json)"""
+    boundary = uuid.uuid4().hex
+    body = b''.join([
+        f'--{boundary}\r\n'.encode(),
+        f'Content-Disposition: form-data; name="image"; filename="{filename}"\r\n'.encode(),
+        b'Content-Type: application/octet-stream\r\n\r\n',
+        image_bytes,
+        f'\r\n--{boundary}--\r\n'.encode(),
+    ])
+    req = urllib.request.Request(url, data=body, method='POST', headers={
+        'Content-Type': f'multipart/form-data; boundary={boundary}'
+    })
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, json.loads(resp.read())
+    except urllib.error.HTTPError as e:
+        return e.code, _error_body(e)
+
+
+def get_json(url, timeout=5):
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as resp:
+            return resp.status, json.loads(resp.read())
+    except urllib.error.HTTPError as e:
+        return e.code, _error_body(e)
+
+
+def drive_load(url, images, requests, concurrency, warmup=True, timeout=300):
+    """POST `requests` images to url/predict from `concurrency` threads"""
+    def one(i):
+        start = time.perf_counter()
+        try:
+            status, _ = post_image(url + '/predict', images[i % len(images)], timeout=timeout)
+        except OSError:
+            status = None
+        return status, time.perf_counter() - start
+
+    # Warm-up request per worker thread so lazy allocations are not timed
+    if warmup:
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(one, range(concurrency)))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - start
+
+    latencies = [elapsed for status, elapsed in results if status == 200]
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'errors': sum(1 for status, _ in results if status != 200),
+        'status_counts': {str(k): v for k, v in Counter(s for s, _ in results).items()},
+        'wall_seconds': round(wall, 3),
+        'throughput_rps': round(len(latencies) / wall, 3) if wall > 0 else None,
+        'latency_ms': percentiles(latencies),
+    }
+
+
+def write_report(report, output=None):
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text)
+    print(text)
+
+
+def random_weight_registry():
+    """Temporary registry with randomly initialised weights, for sandboxes
+    without the trained checkpoint. Returns the directory path, which is
+    removed when the benchmark exits."""
+    from safetensors.torch import save_file
+    from tb_model import TBClassifier
+    from model_registry import DEFAULT_VERSION
+
+    root = Path(tempfile.mkdtemp(prefix='drishti-registry-'))
+    # ~80 MB per run; servers using it are stopped before atexit runs
+    atexit.register(shutil.rmtree, root, ignore_errors=True)
+    state_dict = TBClassifier(pretrained=False).state_dict()
+    save_file({k: v.contiguous() for k, v in state_dict.items()},
+              str(root / f'{DEFAULT_VERSION}.safetensors'))
+    return root
+
+
+class ServerProcess:
+    """Run a backend entry point on a free port until /health reports ready"""
+
+    def __init__(self, args, env=None, startup_timeout=300, log_path=None):
+        self.port = free_port()
+        self.url = f'http://127.0.0.1:{self.port}'
+        self.args = args
+        # History off: benchmark traffic must not land in the real results
+        # database, nor pay for write-behind while being measured
+        self.env = dict(os.environ, DRISHTI_PORT=str(self.port), DRISHTI_PACING='off',
+                        DRISHTI_RESULTS='off')
+        self.env.update(env or {})
+        self.startup_timeout = startup_timeout
+        self.process = None
+        self.bind_seconds = None
+        self.startup_seconds = None
+        self.health = None
+        self.log_path = log_path
+
+    def __enter__(self):
+        start = time.perf_counter()
+        log = open(self.log_path, 'w') if self.log_path else subprocess.DEVNULL
+        self.process = subprocess.Popen(
+            [sys.executable] + self.args, cwd=str(BACKEND_DIR), env=self.env,
+            stdout=log, stderr=subprocess.STDOUT
+        )
+        deadline = start + self.startup_timeout
+        while time.perf_counter() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Server exited during startup: {self.args}")
+            try:
+                status, self.health = get_json(self.url + '/health', timeout=1)
+            except OSError:
+                time.sleep(0.05)
+                continue
+            if self.bind_seconds is None:
+                self.bind_seconds = time.perf_counter() - start
+            if status == 200:
+                self.startup_seconds = time.perf_counter() - start
+                return self
+            time.sleep(0.2)
+        self.__exit__()
+        raise TimeoutError(f"Server not ready after {self.startup_timeout}s")
+
+    def __exit__(self, *exc):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
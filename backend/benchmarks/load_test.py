@@ -0,0 +1,96 @@
+"""
+Concurrent /predict load generator for the TB detection backend
+Drives a running server (--url) or starts one on a free port (--server),
+then sweeps the requested concurrency levels and reports throughput and
+p50/p95/p99 latency for each, so runs can be compared across serving
+modes, batch sizes and pacing modes.
+
+Usage:
+    python benchmarks/load_test.py --server in_process --concurrency 1,4,8
+    python benchmarks/load_test.py --server split --max-batch 4 --random-weights
+    python benchmarks/load_test.py --url http://localhost:5000 --requests 32
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from common import (
+    ServerProcess, drive_load, encode_image, get_json, random_weight_registry,
+    synthetic_xray, write_report
+)
+
+SERVERS = {
+    'in_process': ['server.py'],
+    'split': ['serve_split.py'],
+}
+
+
+def run_sweep(url, images, args):
+    results = []
+    for concurrency in [int(c) for c in args.concurrency.split(',')]:
+        print(f"Concurrency {concurrency}...", file=sys.stderr)
+        results.append(drive_load(
+            url, images, args.requests, concurrency,
+            warmup=not args.no_warmup, timeout=args.timeout
+        ))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--url', help="drive an already running server")
+    target.add_argument('--server', choices=sorted(SERVERS), default='in_process',
+                        help="server to start for the run")
+    parser.add_argument('--concurrency', default='1,4',
+                        help="comma-separated concurrency levels to sweep")
+    parser.add_argument('--requests', type=int, default=32, help="requests per level")
+    parser.add_argument('--pacing', choices=['off', 'demo'], default='off',
+                        help="DRISHTI_PACING for a started server")
+    parser.add_argument('--frontends', type=int, default=4, help="split mode only")
+    parser.add_argument('--max-batch', type=int, default=8, help="split mode only")
+    parser.add_argument('--image-size', type=int, default=2048)
+    parser.add_argument('--format', default='JPEG', choices=['JPEG', 'PNG'])
+    parser.add_argument('--images', type=int, default=4, help="distinct synthetic images")
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--no-warmup', action='store_true')
+    parser.add_argument('--random-weights', action='store_true',
+                        help="use a temporary registry with untrained weights")
+    parser.add_argument('--server-log', help="write server output to this file")
+    parser.add_argument('--output', help="write JSON results to this file")
+    args = parser.parse_args()
+
+    images = [
+        encode_image(synthetic_xray(args.image_size, seed=i), fmt=args.format)
+        for i in range(args.images)
+    ]
+    report = {
+        'benchmark': 'load',
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'cpu_count': os.cpu_count(),
+        'params': vars(args),
+    }
+
+    if args.url:
+        _, report['health'] = get_json(args.url + '/health')
+        report['results'] = run_sweep(args.url, images, args)
+    else:
+        env = {'DRISHTI_PACING': args.pacing}
+        if args.random_weights:
+            env['DRISHTI_MODEL_REGISTRY'] = str(random_weight_registry())
+        server_args = list(SERVERS[args.server])
+        if args.server == 'split':
+            server_args += ['--frontends', str(args.frontends),
+                            '--max-batch', str(args.max_batch)]
+        with ServerProcess(server_args, env=env, log_path=args.server_log) as server:
+            report['startup_seconds'] = round(server.startup_seconds, 2)
+            report['health'] = server.health
+            report['results'] = run_sweep(server.url, images, args)
+
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,494 @@
+"""
+Model export for mobile and edge deployment
+Builds TBClassifier from the shared definition in tb_model.py and emits
+PyTorch Lite (.ptl), ONNX and TFLite artifacts from one checkpoint.
+
+Artifacts are cached under <cache>/<key>/ where the key hashes the
+checkpoint contents together with the export options, so re-running with
+an unchanged checkpoint skips straight to the report. Every artifact is
+checked against the PyTorch reference on a fixed image set (parity and
+latency) and the fastest one that agrees is reported as recommended.
+
+Progress is reported on stdout as PROGRESS:{json} / COMPLETE:{json} lines.
+
+Usage:
+    python export_model.py [--formats ptl,onnx,tflite] [--version <registry version>]
+    python export_model.py --checkpoint best_model.pt --formats ptl
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from model_registry import ModelRegistry, load_checkpoint_state_dict
+from model_constants import INPUT_SIZE
+from tb_model import TBClassifier
+
+BASE_DIR = Path(__file__).parent.parent
+DEFAULT_CACHE_DIR = BASE_DIR / "models" / "exports"
+ASSETS_DIR = BASE_DIR / "assets" / "models"
+
+# Bump when the export code changes in a way that alters artifacts
+EXPORTER_REVISION = 1
+
+FORMATS = ('ptl', 'onnx', 'tflite')
+ARTIFACT_NAMES = {
+    'ptl': 'tb_detector_mobile.ptl',
+    'onnx': 'tb_detector.onnx',
+    'tflite': 'tb_detector.tflite',
+}
+
+
+class ConversionProgress:
+    """Track and report conversion progress"""
+
+    def __init__(self, total_steps):
+        self.total_steps = total_steps
+        self.current_step = 0
+        self.start_time = None
+
+    def start(self):
+        self.start_time = time.time()
+        self.update(0, "Initializing conversion process")
+
+    def update(self, step, message, substep=None):
+        self.current_step = step
+        elapsed = time.time() - self.start_time if self.start_time else 0
+        progress_percent = (step / self.total_steps) * 100
+
+        progress_data = {
+            'step': step,
+            'total_steps': self.total_steps,
+            'progress': round(progress_percent, 2),
+            'message': message,
+            'substep': substep,
+            'elapsed_time': round(elapsed, 2)
+        }
+
+        # Output JSON for progress tracking (can be consumed by UI)
+        print(f"PROGRESS:{json.dumps(progress_data)}")
+        sys.stdout.flush()
+
+    def complete(self, success=True, error_msg=None):
+        elapsed = time.time() - self.start_time
+        result = {
+            'success': success,
+            'total_time': round(elapsed, 2),
+            'error': error_msg
+        }
+        print(f"COMPLETE:{json.dumps(result)}")
+        sys.stdout.flush()
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_reference(version=None, checkpoint=None, trust_pickle=False):
+    """Returns (model, source_path) from a registry version or a .pt checkpoint"""
+    if checkpoint:
+        model = TBClassifier(pretrained=False, dropout=0.3)
+        model.load_state_dict(load_checkpoint_state_dict(checkpoint, trust_pickle))
+        model.eval()
+        return model, Path(checkpoint)
+
+    registry = ModelRegistry()
+    version = version or registry.default_version()
+    return registry.load(version, torch.device('cpu')), registry.path_for(version)
+
+
+def export_options(args):
+    """Options that change the bytes of each artifact"""
+    return {
+        'ptl': {'mobile_optimize': not args.no_mobile_optimize},
+        'onnx': {'opset': args.opset},
+        'tflite': {'opset': args.opset, 'quantize': args.tflite_quantize},
+    }
+
+
+def cache_key(checkpoint_hash, fmt, options):
+    key = json.dumps({
+        'checkpoint': checkpoint_hash,
+        'format': fmt,
+        'options': options,
+        'input_size': INPUT_SIZE,
+        'torch': torch.__version__,
+        'revision': EXPORTER_REVISION,
+    }, sort_keys=True)
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def _export_ptl(model, example, output_path, options):
+    from torch.utils.mobile_optimizer import optimize_for_mobile
+
+    traced_model = torch.jit.trace(model, example)
+    if options['mobile_optimize']:
+        traced_model = optimize_for_mobile(traced_model)
+    traced_model._save_for_lite_interpreter(str(output_path))
+
+
+def _export_onnx(model, example, output_path, options):
+    import onnx
+
+    torch.onnx.export(
+        model,
+        example,
+        str(output_path),
+        export_params=True,
+        opset_version=options['opset'],
+        do_constant_folding=True,
+        dynamo=False,
+        input_names=['input'],
+        output_names=['output'],
+        dynamic_axes={
+            'input': {0: 'batch_size'},
+            'output': {0: 'batch_size'}
+        }
+    )
+    onnx.checker.check_model(onnx.load(str(output_path)))
+
+
+def _export_tflite(onnx_path, output_path, options):
+    import onnx
+    from onnx_tf.backend import prepare
+    import tensorflow as tf
+
+    tf_model_path = output_path.parent / "saved_model"
+    try:
+        prepare(onnx.load(str(onnx_path))).export_graph(str(tf_model_path))
+        converter = tf.lite.TFLiteConverter.from_saved_model(str(tf_model_path))
+        if options['quantize'] in ('dynamic', 'float16'):
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if options['quantize'] == 'float16':
+            converter.target_spec.supported_types = [tf.float16]
+        output_path.write_bytes(converter.convert())
+    finally:
+        if tf_model_path.exists():
+            shutil.rmtree(tf_model_path)
+
+
+def build_artifact(fmt, model, example, entry_dir, options, artifacts):
+    """Exports into entry_dir; the manifest is written last, so a cache
+    entry without one is treated as incomplete and rebuilt"""
+    if entry_dir.exists():
+        shutil.rmtree(entry_dir)
+    entry_dir.mkdir(parents=True)
+    output_path = entry_dir / ARTIFACT_NAMES[fmt]
+
+    started = time.perf_counter()
+    if fmt == 'ptl':
+        _export_ptl(model, example, output_path, options)
+    elif fmt == 'onnx':
+        _export_onnx(model, example, output_path, options)
+    elif fmt == 'tflite':
+        # Converted from the (cached) ONNX artifact rather than re-exported
+        _export_tflite(artifacts['onnx']['path'], output_path, options)
+    seconds = time.perf_counter() - started
+
+    manifest = {
+        'format': fmt,
+        'artifact': output_path.name,
+        'options': options,
+        'export_seconds': round(seconds, 2),
+        'size_mb': round(output_path.stat().st_size / (1024 * 1024), 2),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    (entry_dir / 'manifest.json').write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+
+def load_runner(fmt, path):
+    """Callable mapping an Nx3xHxW float32 array to N probabilities"""
+    if fmt == 'ptl':
+        from torch.jit.mobile import _load_for_lite_interpreter
+        module = _load_for_lite_interpreter(str(path))
+        return lambda batch: module(torch.from_numpy(batch)).numpy().reshape(-1)
+    if fmt == 'onnx':
+        import onnxruntime
+        session = onnxruntime.InferenceSession(str(path), providers=['CPUExecutionProvider'])
+        return lambda batch: session.run(None, {'input': batch})[0].reshape(-1)
+    if fmt == 'tflite':
+        import tensorflow as tf
+        interpreter = tf.lite.Interpreter(model_path=str(path))
+        input_index = interpreter.get_input_details()[0]['index']
+        output_index = interpreter.get_output_details()[0]['index']
+
+        def run(batch):
+            interpreter.resize_tensor_input(input_index, batch.shape)
+            interpreter.allocate_tensors()
+            interpreter.set_tensor(input_index, batch)
+            interpreter.invoke()
+            return interpreter.get_tensor(output_index).reshape(-1)
+        return run
+    raise ValueError(f"Unknown format: {fmt}")
+
+
+def parity_images(image_dir=None, count=8):
+    """Fixed evaluation set as 1x3xHxW arrays, preprocessed like /predict.
+    Uses the X-rays in image_dir when given, else deterministic synthetic films."""
+    from uploads import open_xray
+    from pipeline import preprocess_image
+
+    if image_dir:
+        paths = sorted(p for p in Path(image_dir).iterdir()
+                       if p.suffix.lower() in ('.png', '.jpg', '.jpeg'))[:count]
+        images = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                images.append(open_xray(f)[0])
+    else:
+        from synthetic import synthetic_xray
+        images = [synthetic_xray(1024, seed=i) for i in range(count)]
+
+    return [
+        np.ascontiguousarray(preprocess_image(img).transpose(2, 0, 1)[None])
+        for img in images
+    ]
+
+
+def measure(run, images, repeats):
+    outputs = np.array([float(run(batch)[0]) for batch in images])
+    run(images[0])  # warm-up
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run(images[0])
+        samples.append(time.perf_counter() - start)
+    latency = {
+        'median_ms': round(statistics.median(samples) * 1000, 2),
+        'min_ms': round(min(samples) * 1000, 2),
+    }
+    return outputs, latency
+
+
+def parity_report(reference, artifacts, images, atol, repeats):
+    from pipeline import assess_risk
+
+    def reference_run(batch):
+        return reference(torch.from_numpy(batch)).numpy().reshape(-1)
+
+    expected, latency = measure(reference_run, images, repeats)
+    expected_risk = [assess_risk(p)[1] for p in expected]
+    report = {'pytorch': {'latency': latency, 'probabilities': expected.round(6).tolist()}}
+
+    for fmt, artifact in artifacts.items():
+        try:
+            outputs, latency = measure(load_runner(fmt, artifact['path']), images, repeats)
+        except ImportError as e:
+            report[fmt] = {'error': f"Missing runtime: {e}"}
+            continue
+        diff = np.abs(outputs - expected)
+        risk_agreement = float(np.mean([
+            assess_risk(p)[1] == r for p, r in zip(outputs, expected_risk)
+        ]))
+        report[fmt] = {
+            'latency': latency,
+            'max_abs_diff': float(diff.max()),
+            'mean_abs_diff': float(diff.mean()),
+            'risk_level_agreement': risk_agreement,
+            'passes': bool(diff.max() <= atol and risk_agreement == 1.0),
+        }
+    return report
+
+
+def publish(artifact_path, assets_dir):
+    """Copy into the app's assets unless an identical file is already there"""
+    target = assets_dir / artifact_path.name
+    if target.exists() and file_sha256(target) == file_sha256(artifact_path):
+        return target
+    assets_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = target.with_name(target.name + '.tmp')
+    shutil.copyfile(artifact_path, tmp_path)
+    os.replace(tmp_path, target)
+    return target
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the TB model to mobile formats")
+    parser.add_argument('--formats', default=','.join(FORMATS),
+                        help="comma-separated subset of ptl,onnx,tflite")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--version', help="model registry version (default: serving default)")
+    source.add_argument('--checkpoint', help="training checkpoint (.pt) instead of the registry")
+    parser.add_argument('--trust-pickle', action='store_true',
+                        help="load --checkpoint with full unpickling (trusted files only)")
+    parser.add_argument('--opset', type=int, default=13)
+    parser.add_argument('--tflite-quantize', choices=['none', 'dynamic', 'float16'], default='float16',
+                        help="float16 weights (default), dynamic-range int8 weights, or none")
+    parser.add_argument('--no-mobile-optimize', action='store_true')
+    parser.add_argument('--cache-dir', default=str(DEFAULT_CACHE_DIR))
+    parser.add_argument('--assets-dir', default=str(ASSETS_DIR))
+    parser.add_argument('--no-publish', action='store_true',
+                        help="leave artifacts in the cache only")
+    parser.add_argument('--force', action='store_true', help="ignore cached artifacts")
+    parser.add_argument('--images', help="directory of X-rays for the parity set")
+    parser.add_argument('--num-images', type=int, default=8)
+    parser.add_argument('--atol', type=float, default=1e-3,
+                        help="max probability difference from PyTorch to pass")
+    parser.add_argument('--repeats', type=int, default=10, help="latency samples per format")
+    parser.add_argument('--skip-parity', action='store_true')
+    args = parser.parse_args(argv)
+
+    formats = [f for f in FORMATS if f in args.formats.split(',')]
+    unknown = set(args.formats.split(',')) - set(FORMATS)
+    if unknown or not formats:
+        parser.error(f"Unknown formats: {', '.join(sorted(unknown)) or args.formats}")
+    # TFLite is converted from the ONNX artifact
+    build_formats = ['onnx'] + formats if 'tflite' in formats and 'onnx' not in formats else formats
+
+    cache_dir = Path(args.cache_dir)
+    options = export_options(args)
+    progress = ConversionProgress(total_steps=len(build_formats) + 3)
+
+    try:
+        progress.start()
+
+        progress.update(1, "Loading PyTorch model")
+        reference, source_path = load_reference(args.version, args.checkpoint, args.trust_pickle)
+        checkpoint_hash = file_sha256(source_path)
+        example = torch.zeros(1, 3, INPUT_SIZE, INPUT_SIZE)
+
+        artifacts = {}
+        errors = {}
+        # Formats that failed for want of an exporter or runtime package
+        missing = set()
+        for step, fmt in enumerate(build_formats, start=2):
+            key = cache_key(checkpoint_hash, fmt, options[fmt])
+            entry_dir = cache_dir / f"{fmt}-{key}"
+            manifest_path = entry_dir / 'manifest.json'
+            if manifest_path.exists() and not args.force:
+                progress.update(step, f"Using cached {fmt.upper()} artifact", key)
+                manifest = json.loads(manifest_path.read_text())
+                cached = True
+            elif fmt == 'tflite' and 'onnx' not in artifacts:
+                errors[fmt] = "not exported: needs the ONNX artifact"
+                continue
+            else:
+                progress.update(step, f"Exporting {fmt.upper()} artifact", key)
+                try:
+                    manifest = build_artifact(fmt, reference, example, entry_dir, options[fmt], artifacts)
+                except ImportError as e:
+                    # A missing exporter only costs its own format
+                    errors[fmt] = f"not exported: missing dependency: {e}"
+                    missing.add(fmt)
+                    progress.update(step, f"Skipped {fmt.upper()} artifact", errors[fmt])
+                    continue
+                cached = False
+            artifacts[fmt] = dict(manifest, key=key, cached=cached,
+                                  path=entry_dir / manifest['artifact'])
+
+        artifacts = {fmt: artifacts[fmt] for fmt in formats if fmt in artifacts}
+
+        step = len(build_formats) + 2
+        parity = None
+        if not args.skip_parity:
+            progress.update(step, "Checking parity and latency against PyTorch")
+            images = parity_images(args.images, args.num_images)
+            with torch.no_grad():
+                parity = parity_report(reference, artifacts, images, args.atol, args.repeats)
+            for fmt in artifacts:
+                result = parity[fmt]
+                if 'error' in result:
+                    # Unverified artifacts are not published, so the run is incomplete
+                    errors[fmt] = f"not checked or published: {result['error']}"
+                    missing.add(fmt)
+                elif not result['passes']:
+                    # Neither is one that disagrees; assets keep the previous file
+                    errors[fmt] = (
+                        f"failed parity, not published: max diff {result['max_abs_diff']:.2e} "
+                        f"(atol {args.atol:g}), risk level agreement "
+                        f"{result['risk_level_agreement']:.0%}"
+                    )
+
+        progress.update(step + 1, "Publishing artifacts")
+        if not args.no_publish:
+            # Never ship an artifact that disagrees with the reference
+            for fmt, artifact in artifacts.items():
+                if parity is None or parity[fmt].get('passes'):
+                    artifact['published'] = str(publish(artifact['path'], Path(args.assets_dir)))
+
+        recommended = None
+        if parity:
+            passing = [fmt for fmt in artifacts if parity[fmt].get('passes')]
+            if passing:
+                recommended = min(passing, key=lambda f: parity[f]['latency']['median_ms'])
+
+        report = {
+            'source': str(source_path),
+            'checkpoint_sha256': checkpoint_hash,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'artifacts': {
+                fmt: {k: str(v) if isinstance(v, Path) else v for k, v in artifact.items()}
+                for fmt, artifact in artifacts.items()
+            },
+            'errors': errors,
+            'parity': parity,
+            'recommended': recommended,
+        }
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        report_path = cache_dir / 'report.json'
+        report_path.write_text(json.dumps(report, indent=2))
+
+        error_msg = '; '.join(f"{fmt}: {error}" for fmt, error in errors.items())
+        progress.complete(success=not errors, error_msg=error_msg or None)
+
+        print(f"\n{'='*80}")
+        print("EXPORT SUCCESSFUL!" if not errors else "EXPORT INCOMPLETE")
+        print(f"{'='*80}")
+        for fmt, artifact in artifacts.items():
+            line = f"{fmt.upper():<7} {artifact['size_mb']:>8.2f} MB  "
+            line += "cached" if artifact['cached'] else f"exported in {artifact['export_seconds']}s"
+            if parity and 'latency' in parity[fmt]:
+                result = parity[fmt]
+                line += (f"  {result['latency']['median_ms']:.1f} ms"
+                         f"  max diff {result['max_abs_diff']:.2e}"
+                         f"  {'PASS' if result['passes'] else 'FAIL'}")
+            print(line)
+        for fmt, error in errors.items():
+            print(f"{fmt.upper():<7} {error}")
+        if missing:
+            print("Install required packages: pip install onnx onnxruntime onnx-tf tensorflow")
+        if parity:
+            print(f"PyTorch reference: {parity['pytorch']['latency']['median_ms']:.1f} ms")
+            print(f"Recommended: {recommended or 'none (no artifact passed parity)'}")
+        print(f"Report: {report_path}")
+        print(f"{'='*80}\n")
+        return not errors
+
+    except ImportError as e:
+        error_msg = f"Missing dependency: {str(e)}"
+        progress.complete(success=False, error_msg=error_msg)
+        print(f"\nERROR: {error_msg}")
+        print("\nInstall required packages:")
+        print("pip install onnx onnxruntime onnx-tf tensorflow")
+        return False
+
+    except Exception as e:
+        error_msg = str(e)
+        progress.complete(success=False, error_msg=error_msg)
+        print(f"\nERROR: {error_msg}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+if __name__ == "__main__":
+    print("="*80)
+    print("DRISHTI AI - MODEL EXPORT")
+    print("="*80)
+
+    success = main()
+    sys.exit(0 if success else 1)
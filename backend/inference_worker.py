@@ -0,0 +1,75 @@
+"""
+Model-owner process for split-process serving
+Owns the only TBClassifier + Grad-CAM++ instance and serves batches out of
+a TensorRing filled by the HTTP front-end processes.
+"""
+
+import time
+import traceback
+
+import numpy as np
+import torch
+
+from model_registry import ModelRegistry
+from tb_model import GradCAMPlusPlus, warmup_model
+from shm_ring import WANT_CAM
+
+
+def run_model_owner(ring, version=None, max_batch=8, batch_window=0.002, launched=None):
+    """Process entry point; returns when `ring.stop` is set.
+    `launched` is the launcher's perf_counter() at start, for ready_seconds."""
+    torch.set_grad_enabled(False)
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+    registry = ModelRegistry()
+    version = version or registry.default_version()
+    print(f"Model owner: loading {version} on {device}")
+    phase_started = time.perf_counter()
+    model = registry.load(version, device)
+    ring.set_phase('warming', load_seconds=time.perf_counter() - phase_started)
+
+    phase_started = time.perf_counter()
+    warmup_model(model, device)
+    warmup_seconds = time.perf_counter() - phase_started
+
+    # One hook for the lifetime of the process
+    gradcam = GradCAMPlusPlus(model, model.backbone.features[-1])
+
+    ring.publish(version, device)
+    ring.set_phase(
+        'ready',
+        warmup_seconds=warmup_seconds,
+        ready_seconds=time.perf_counter() - (launched or phase_started)
+    )
+    ring.ready.set()
+    print(f"Model owner: READY (max batch {max_batch})")
+
+    while not ring.stop.is_set():
+        indices = ring.claim_batch(max_batch, batch_window)
+        if len(indices) == 0:
+            continue
+        try:
+            _run_batch(ring, model, gradcam, indices, device)
+            ring.complete(indices)
+        except Exception:
+            traceback.print_exc()
+            ring.complete(indices, failed=True)
+
+    gradcam.remove()
+
+
+def _run_batch(ring, model, gradcam, indices, device):
+    batch = torch.from_numpy(ring.inputs[indices]).to(device)
+    want_cam = ring.header[indices, WANT_CAM].astype(bool)
+
+    plain = np.flatnonzero(~want_cam)
+    if len(plain):
+        output = model(batch[torch.as_tensor(plain)])
+        ring.probs[indices[plain]] = output.view(-1).cpu().numpy()
+
+    with_cam = np.flatnonzero(want_cam)
+    if len(with_cam):
+        with torch.enable_grad():
+            cam = gradcam.generate_cam(batch[torch.as_tensor(with_cam)].requires_grad_(True))
+        ring.probs[indices[with_cam]] = gradcam.output.view(-1).cpu().numpy()
+        ring.cams[indices[with_cam]] = cam[:, 0].cpu().numpy()
@@ -0,0 +1,8 @@
+"""
+Model constants shared by the torch and torch-free parts of the backend
+Front-end processes (uploads, pipeline, shm_ring) import these without
+pulling in torch/torchvision through tb_model.
+"""
+
+# Model input resolution (square)
+INPUT_SIZE = 512
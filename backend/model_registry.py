@@ -0,0 +1,205 @@
+"""
+Versioned model registry for the TB detection server
+Each model version is one safetensors file: <registry>/<version>.safetensors
+
+Weights are memory-mapped on load, so every worker process on the box
+shares the same page-cache pages instead of unpickling a private copy.
+
+An install that predates the registry is migrated on first start: when the
+registry is empty, models/v3_anti_artifact_512_10pct/best_model.pt is
+imported as the default version. Other checkpoints are imported with
+    python model_registry.py import <checkpoint.pt> <version>
+
+The version activated through /admin/models/activate (or
+    python model_registry.py activate <version>)
+is recorded in <registry>/ACTIVE, so restarts, split mode and the export
+tool keep serving it.
+"""
+
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+DEFAULT_REGISTRY_DIR = Path(os.environ.get(
+    'DRISHTI_MODEL_REGISTRY',
+    Path(__file__).parent.parent / "models" / "registry"
+))
+DEFAULT_VERSION = 'v3_anti_artifact_512_10pct'
+# Training output the server loaded before the registry existed
+LEGACY_CHECKPOINT = Path(os.environ.get(
+    'DRISHTI_MODEL_CHECKPOINT',
+    Path(__file__).parent.parent / "models" / DEFAULT_VERSION / "best_model.pt"
+))
+
+_VERSION_PATTERN = re.compile(r'[A-Za-z0-9][A-Za-z0-9._-]*')
+
+
+def load_checkpoint_state_dict(checkpoint_path, trust_pickle=False, retry_command=None):
+    """State dict from a training checkpoint (.pt).
+
+    Loads with weights_only=True; full unpickling runs arbitrary code from
+    the file, so it is only used when the caller passes trust_pickle.
+    `retry_command` is the command the error tells the user to run instead.
+    """
+    import pickle
+    import torch
+
+    try:
+        checkpoint = torch.load(
+            str(checkpoint_path),
+            map_location='cpu',
+            weights_only=not trust_pickle
+        )
+    except pickle.UnpicklingError as e:
+        retry = f"run: {retry_command}" if retry_command else "re-run with --trust-pickle"
+        raise ValueError(
+            f"{checkpoint_path} holds more than plain tensors and cannot be "
+            f"loaded with weights_only=True ({e}).\n"
+            f"Only if the file comes from a trusted source, {retry}"
+        ) from e
+    return checkpoint.get('model_state_dict', checkpoint)
+
+
+class ModelRegistry:
+    """Directory of versioned safetensors checkpoints"""
+
+    SUFFIX = '.safetensors'
+    ACTIVE_FILE = 'ACTIVE'
+
+    def __init__(self, root=DEFAULT_REGISTRY_DIR):
+        self.root = Path(root)
+
+    def path_for(self, version):
+        if not isinstance(version, str) or not _VERSION_PATTERN.fullmatch(version):
+            raise ValueError(f"Invalid model version: {version!r}")
+        return self.root / f"{version}{self.SUFFIX}"
+
+    def versions(self):
+        if not self.root.is_dir():
+            return []
+        entries = []
+        for path in sorted(self.root.glob(f"*{self.SUFFIX}")):
+            stat = path.stat()
+            entries.append({
+                'version': path.name[:-len(self.SUFFIX)],
+                'size_mb': round(stat.st_size / (1024 * 1024), 2),
+                'modified': time.strftime(
+                    '%Y-%m-%dT%H:%M:%S', time.localtime(stat.st_mtime)
+                )
+            })
+        return entries
+
+    def active_version(self):
+        """Version recorded by set_active(), or None if unset or since removed"""
+        try:
+            version = (self.root / self.ACTIVE_FILE).read_text().strip()
+        except FileNotFoundError:
+            return None
+        try:
+            if self.path_for(version).exists():
+                return version
+        except ValueError:
+            pass
+        print(f"Ignoring {self.root / self.ACTIVE_FILE}: no such model version {version!r}")
+        return None
+
+    def set_active(self, version):
+        """Record `version` as the one to serve after a restart"""
+        self.path_for(version)
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self.root / self.ACTIVE_FILE
+        tmp_path = path.with_name(path.name + '.tmp')
+        tmp_path.write_text(version + '\n')
+        os.replace(tmp_path, path)
+
+    def default_version(self):
+        """DRISHTI_MODEL_VERSION if set, else the activated version, else the
+        v3 model, else the newest. An empty registry imports LEGACY_CHECKPOINT
+        once, if it exists."""
+        requested = os.environ.get('DRISHTI_MODEL_VERSION')
+        if requested:
+            return requested
+        active = self.active_version()
+        if active:
+            return active
+        if self.path_for(DEFAULT_VERSION).exists():
+            return DEFAULT_VERSION
+        available = self.versions()
+        if available:
+            return max(available, key=lambda e: e['modified'])['version']
+        if LEGACY_CHECKPOINT.exists():
+            print(f"Registry is empty, importing {LEGACY_CHECKPOINT} as {DEFAULT_VERSION}...")
+            self.import_checkpoint(LEGACY_CHECKPOINT, DEFAULT_VERSION)
+            return DEFAULT_VERSION
+        raise FileNotFoundError(
+            f"No models in registry: {self.root}\n"
+            f"Import one with: python model_registry.py import "
+            f"<best_model.pt> {DEFAULT_VERSION}"
+        )
+
+    def load(self, version, device):
+        """Build TBClassifier with memory-mapped weights for `version`"""
+        from safetensors.torch import load_file
+        from tb_model import TBClassifier
+
+        path = self.path_for(version)
+        if not path.exists():
+            raise FileNotFoundError(f"Model version not found: {path}")
+
+        # load_file maps the file copy-on-write; assign=True keeps the
+        # mapped tensors as parameters instead of copying into fresh ones
+        state_dict = load_file(str(path), device='cpu')
+        model = TBClassifier(pretrained=False, dropout=0.3)
+        model.load_state_dict(state_dict, assign=True)
+        model.to(device)
+        model.eval()
+        return model
+
+    def import_checkpoint(self, checkpoint_path, version, trust_pickle=False):
+        """Convert a training checkpoint (.pt) into a registry version"""
+        from safetensors.torch import save_file
+        from tb_model import TBClassifier
+
+        path = self.path_for(version)
+        state_dict = load_checkpoint_state_dict(
+            checkpoint_path, trust_pickle,
+            retry_command=f"python model_registry.py import {checkpoint_path} {version} --trust-pickle"
+        )
+
+        # Validate against the architecture before publishing
+        TBClassifier(pretrained=False, dropout=0.3).load_state_dict(state_dict)
+
+        tensors = {k: v.contiguous() for k, v in state_dict.items()}
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + '.tmp')
+        save_file(tensors, str(tmp_path), metadata={'source': Path(checkpoint_path).name})
+        # Atomic publish: a loader never sees a partially written file
+        os.replace(tmp_path, path)
+        return path
+
+
+if __name__ == "__main__":
+    registry = ModelRegistry()
+
+    args = [a for a in sys.argv[1:] if a != '--trust-pickle']
+    trust_pickle = len(args) != len(sys.argv) - 1
+
+    if len(args) == 3 and args[0] == 'import':
+        output_path = registry.import_checkpoint(args[1], args[2], trust_pickle)
+        print(f"Imported: {output_path}")
+    elif len(args) == 2 and args[0] == 'activate':
+        if not registry.path_for(args[1]).exists():
+            sys.exit(f"Unknown model version: {args[1]}")
+        registry.set_active(args[1])
+        print(f"Active: {args[1]} (takes effect on the next start)")
+    elif len(args) == 1 and args[0] == 'list':
+        for entry in registry.versions():
+            print(f"{entry['version']:<40} {entry['size_mb']:>8.2f} MB  {entry['modified']}")
+    else:
+        print("Usage:")
+        print("  python model_registry.py list")
+        print("  python model_registry.py import <checkpoint.pt> <version> [--trust-pickle]")
+        print("  python model_registry.py activate <version>")
+        sys.exit(1)
@@ -0,0 +1,236 @@
+"""
+Stage functions for the TB prediction pipeline
+Pure numpy/OpenCV post-processing shared by the in-process server and the
+split front-end processes, so neither needs to own the model.
+"""
+
+import os
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from model_constants import INPUT_SIZE
+
+# 'demo' keeps the staged ~40s pacing the mobile app's progress UI expects,
+# in both serving modes; 'off' disables it for the benchmarks
+PACING = os.environ.get('DRISHTI_PACING', 'demo')
+
+HEATMAP_THRESHOLD = 0.5
+
+
+def pace(seconds):
+    if PACING == 'demo':
+        time.sleep(seconds)
+
+
+def preprocess_image(img):
+    """PIL image -> HxWx3 float32 array in [0, 1] at model resolution"""
+    # Resize before converting: grayscale films are resampled as one channel
+    img = img.resize((INPUT_SIZE, INPUT_SIZE), Image.Resampling.LANCZOS).convert('RGB')
+    return np.array(img).astype(np.float32) / 255.0
+
+
+def assess_risk(probability):
+    """Returns (classification, risk_level, confidence)"""
+    if probability >= 0.7:
+        return 'TB Positive (High Confidence)', 'high', probability
+    elif probability >= 0.5:
+        return 'TB Positive', 'high', probability
+    elif probability >= 0.3:
+        return 'Uncertain - Further Testing Recommended', 'medium', 0.5
+    else:
+        return 'TB Negative', 'low', 1.0 - probability
+
+
+def segment_lungs(original_img_np):
+    """Soft lung mask from the X-ray itself, combined with anatomical ellipses"""
+    # ADVANCED LUNG SEGMENTATION: Create precise lung mask from X-ray
+    original_img_gray = cv2.cvtColor(original_img_np, cv2.COLOR_RGB2GRAY)
+
+    # Apply CLAHE for better contrast
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    enhanced = clahe.apply(original_img_gray)
+
+    # Use Otsu's thresholding to separate lungs from background
+    _, lung_binary = cv2.threshold(
+        enhanced, 0, 255,
+        cv2.THRESH_BINARY + cv2.THRESH_OTSU
+    )
+
+    # Morphological operations to clean up mask
+    kernel_open = cv2.getStructuringElement(
+        cv2.MORPH_ELLIPSE, (15, 15)
+    )
+    kernel_close = cv2.getStructuringElement(
+        cv2.MORPH_ELLIPSE, (25, 25)
+    )
+
+    lung_binary = cv2.morphologyEx(
+        lung_binary, cv2.MORPH_CLOSE, kernel_close
+    )
+    lung_binary = cv2.morphologyEx(
+        lung_binary, cv2.MORPH_OPEN, kernel_open
+    )
+
+    # Fill holes in lung regions
+    from scipy import ndimage
+    lung_filled = ndimage.binary_fill_holes(lung_binary)
+    lung_mask_precise = lung_filled.astype(np.float32)
+
+    # Apply Gaussian blur to smooth mask edges
+    lung_mask_precise = cv2.GaussianBlur(
+        lung_mask_precise, (21, 21), 0
+    )
+
+    # Create anatomical lung region mask (fallback)
+    h, w = original_img_gray.shape
+    anatomical_mask = np.zeros((h, w), dtype=np.float32)
+
+    # Left lung: elliptical region
+    cv2.ellipse(anatomical_mask,
+                center=(int(w*0.30), int(h*0.50)),
+                axes=(int(w*0.12), int(h*0.28)),
+                angle=10, startAngle=0, endAngle=360,
+                color=1, thickness=-1)
+
+    # Right lung: elliptical region
+    cv2.ellipse(anatomical_mask,
+                center=(int(w*0.70), int(h*0.50)),
+                axes=(int(w*0.12), int(h*0.28)),
+                angle=-10, startAngle=0, endAngle=360,
+                color=1, thickness=-1)
+
+    # Combine precise segmentation with anatomical mask
+    lung_mask_combined = np.maximum(
+        lung_mask_precise * 0.7, anatomical_mask
+    )
+    return cv2.GaussianBlur(lung_mask_combined, (15, 15), 0)
+
+
+def mask_cam(cam_np, lung_mask):
+    """Upsample a raw Grad-CAM++ map and restrict it to the lung fields"""
+    cam_resized = cv2.resize(cam_np, (INPUT_SIZE, INPUT_SIZE))
+
+    # REALISTIC HEATMAP: Keep FULL gradient (blue->green->yellow->red)
+    # NO aggressive thresholding - show all attention levels
+
+    # Normalize CAM to [0, 1] (pure Grad-CAM++ output)
+    cam_normalized = cam_resized.copy()
+    if cam_normalized.max() > 0:
+        cam_normalized = (cam_normalized - cam_normalized.min()) / \
+                         (cam_normalized.max() - cam_normalized.min())
+
+    # Apply ONLY lung mask to focus on lung regions
+    # Keep full gradient - blue (low) to red (high)
+    cam_masked = cam_normalized * lung_mask
+
+    # Very light smoothing to reduce noise but keep gradient
+    cam_masked = cv2.GaussianBlur(cam_masked, (5, 5), 0)
+
+    # Final normalization for full color range
+    if cam_masked.max() > 0:
+        cam_masked = (cam_masked - cam_masked.min()) / \
+                     (cam_masked.max() - cam_masked.min())
+    return cam_masked
+
+
+def render_heatmap(cam_masked, original_img_np):
+    """Returns (heatmap_rgb, overlay) uint8 images"""
+    # Create heatmap with JET colormap (medical standard)
+    # JET: blue (low) -> cyan -> green -> yellow -> red (high)
+    heatmap = cv2.applyColorMap(
+        np.uint8(255 * cam_masked),
+        cv2.COLORMAP_JET
+    )
+    heatmap_rgb = cv2.cvtColor(heatmap, cv2.COLOR_BGR2RGB)
+
+    # Create overlay - SIMPLE alpha blending like notebook
+    # This preserves the beautiful gradient effect
+    alpha = 0.5  # 50% transparency - perfect balance
+    overlay = (
+        (1 - alpha) * original_img_np + alpha * heatmap_rgb
+    ).astype(np.uint8)
+    return heatmap_rgb, overlay
+
+
+def encode_png(image):
+    _, buffer = cv2.imencode('.png', image)
+    return buffer.tobytes()
+
+
+def detect_regions(cam_masked, detect_threshold=0.45):
+    """Names of lung zones whose masked attention exceeds the threshold"""
+    h, w = cam_masked.shape
+    regions_affected = []
+
+    if cam_masked[int(h*0.2):int(h*0.45),
+                  int(w*0.15):int(w*0.45)].max() > detect_threshold:
+        regions_affected.append("left upper lobe")
+
+    if cam_masked[int(h*0.2):int(h*0.45),
+                  int(w*0.55):int(w*0.85)].max() > detect_threshold:
+        regions_affected.append("right upper lobe")
+
+    if cam_masked[int(h*0.45):int(h*0.65),
+                  int(w*0.15):int(w*0.45)].max() > detect_threshold:
+        regions_affected.append("left middle zone")
+
+    if cam_masked[int(h*0.45):int(h*0.65),
+                  int(w*0.55):int(w*0.85)].max() > detect_threshold:
+        regions_affected.append("right middle zone")
+
+    lower_threshold = detect_threshold + 0.1
+    if cam_masked[int(h*0.65):int(h*0.8),
+                  int(w*0.15):int(w*0.45)].max() > lower_threshold:
+        regions_affected.append("left lower lobe")
+
+    if cam_masked[int(h*0.65):int(h*0.8),
+                  int(w*0.55):int(w*0.85)].max() > lower_threshold:
+        regions_affected.append("right lower lobe")
+
+    return regions_affected
+
+
+def recommend(probability):
+    """Returns (urgency_level, recommendations) based on severity"""
+    if probability >= 0.8:
+        return "critical", [
+            "Seek immediate medical attention at nearest TB clinic",
+            "Isolate from family members, use separate room if possible",
+            "Wear a mask when near others",
+            "Start prescribed anti-TB medication as soon as possible",
+            "Follow up with doctor within 48 hours"
+        ]
+    elif probability >= 0.6:
+        return "high", [
+            "Consult a doctor within 3-5 days for confirmation",
+            "Get sputum test (AFB) and GeneXpert test",
+            "Avoid close contact with children and elderly",
+            "Practice cough hygiene - cover mouth when coughing",
+            "Maintain good ventilation at home"
+        ]
+    elif probability >= 0.4:
+        return "moderate", [
+            "Schedule medical consultation within 1-2 weeks",
+            "Monitor symptoms: persistent cough, fever, night sweats",
+            "Get chest X-ray reviewed by radiologist",
+            "Consider additional diagnostic tests",
+            "Maintain healthy diet and adequate rest"
+        ]
+    else:
+        return "low", [
+            "No immediate TB treatment required",
+            "Continue regular health checkups",
+            "Maintain healthy lifestyle and nutrition",
+            "If symptoms develop, consult doctor",
+            "Annual screening recommended for high-risk groups"
+        ]
+
+
+def explain_heatmap(regions_affected):
+    if regions_affected:
+        affected_str = ", ".join(regions_affected)
+        return f"The AI detected suspicious patterns in the {affected_str}. Red/orange areas indicate regions where tuberculosis-related changes are most likely present. These areas show abnormal opacity or infiltrates that are characteristic of TB lesions."
+    return "The AI analysis shows no significant TB-related patterns in the chest X-ray. The lung fields appear relatively clear without characteristic TB lesions."
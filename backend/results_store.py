@@ -0,0 +1,300 @@
+"""
+Persistent prediction history for the TB detection server
+Results are queued by the request thread and written by one background
+thread in batched SQLite transactions, so /predict never waits on disk.
+Heatmap PNGs are stored as content-addressed files (<sha256>.png) next to
+the database rather than as blobs, which keeps rows small and identical
+heatmaps stored once.
+
+Queries use keyset pagination over indexed columns, so a page costs the
+same at ten rows or ten million.
+"""
+
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+DEFAULT_DB_PATH = Path(os.environ.get(
+    'DRISHTI_RESULTS_DB',
+    Path(__file__).parent.parent / "data" / "results.db"
+))
+
+# Bounds the memory a stalled writer can hold (heatmap PNGs dominate)
+MAX_QUEUE_BYTES = int(float(os.environ.get('DRISHTI_RESULTS_QUEUE_MB', 64)) * 1024 * 1024)
+# Accounted per queued result on top of its PNGs
+_ITEM_OVERHEAD_BYTES = 1024
+
+RISK_LEVELS = ('low', 'medium', 'high')
+MAX_PAGE_SIZE = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    clinic_id TEXT,
+    image_sha256 TEXT NOT NULL,
+    probability REAL NOT NULL,
+    risk_level TEXT NOT NULL,
+    classification TEXT NOT NULL,
+    urgency_level TEXT NOT NULL,
+    affected_regions TEXT NOT NULL,
+    model_version TEXT,
+    heatmap_sha256 TEXT,
+    overlay_sha256 TEXT
+);
+CREATE INDEX IF NOT EXISTS results_created ON results (created_at);
+CREATE INDEX IF NOT EXISTS results_risk_created ON results (risk_level, created_at);
+CREATE INDEX IF NOT EXISTS results_clinic_created ON results (clinic_id, created_at);
+CREATE INDEX IF NOT EXISTS results_image ON results (image_sha256);
+"""
+
+_COLUMNS = (
+    'created_at', 'clinic_id', 'image_sha256', 'probability', 'risk_level',
+    'classification', 'urgency_level', 'affected_regions', 'model_version',
+    'heatmap_sha256', 'overlay_sha256'
+)
+_INSERT = (
+    f"INSERT INTO results ({', '.join(_COLUMNS)}) "
+    f"VALUES ({', '.join('?' * len(_COLUMNS))})"
+)
+
+_STOP = object()
+
+
+def parse_time(value):
+    """Epoch seconds or ISO 8601 -> epoch seconds; None passes through"""
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise ValueError(f"Invalid time: {value!r} (use ISO 8601 or epoch seconds)")
+
+
+def encode_cursor(row):
+    return f"{row['created_at']!r}:{row['id']}"
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, row_id = cursor.split(':')
+        return float(created_at), int(row_id)
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+
+
+class ResultsStore:
+    """SQLite prediction history fed by a write-behind queue"""
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, heatmap_dir=None, batch_size=256,
+                 flush_interval=0.5, max_queue_bytes=MAX_QUEUE_BYTES, max_idle_readers=4):
+        self.db_path = Path(db_path)
+        self.heatmap_dir = Path(heatmap_dir) if heatmap_dir else self.db_path.parent / "heatmaps"
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.heatmap_dir.mkdir(parents=True, exist_ok=True)
+
+        self._queue = queue.Queue()
+        # Idle read connections shared by all request threads; the threaded
+        # server runs every request on a new thread, so per-thread
+        # connections would be opened (and leaked to GC) once per query
+        self._readers = queue.LifoQueue(maxsize=max_idle_readers)
+        self.max_queue_bytes = max_queue_bytes
+        self._queued_bytes = 0
+        # Guards _queued_bytes and dropped, both touched by request threads
+        self._stats_lock = threading.Lock()
+        self.stats = {'written': 0, 'dropped': 0, 'failed': 0, 'batches': 0}
+
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+        self._writer = threading.Thread(target=self._write_loop, name='results-writer', daemon=True)
+        self._writer.start()
+
+    def _connect(self, check_same_thread=True):
+        conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=check_same_thread)
+        conn.row_factory = sqlite3.Row
+        # WAL lets readers run while the writer commits; NORMAL only risks
+        # the last batch on power loss, never corruption
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def _reader(self):
+        """A read connection for one query; opened only when none is idle"""
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            conn = self._connect(check_same_thread=False)
+        try:
+            yield conn
+        finally:
+            try:
+                self._readers.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    # Write path
+
+    def record(self, result, image_sha256, heatmap_png=None, overlay_png=None, clinic_id=None):
+        """Queue one prediction; never blocks the request. Returns False if
+        the queue is over its byte budget and the result was dropped.
+
+        Only the stored columns are kept from `result`, not the base64
+        images of the response.
+        """
+        columns = (
+            time.time(),
+            clinic_id,
+            image_sha256,
+            float(result['probability']),
+            result['riskLevel'],
+            result['classification'],
+            result['urgency_level'],
+            json.dumps(result['affected_regions']),
+            result.get('model_version'),
+        )
+        size = _ITEM_OVERHEAD_BYTES + len(heatmap_png or b'') + len(overlay_png or b'')
+        with self._stats_lock:
+            if self._queued_bytes + size > self.max_queue_bytes:
+                self.stats['dropped'] += 1
+                return False
+            self._queued_bytes += size
+        self._queue.put_nowait((columns, heatmap_png, overlay_png, size))
+        return True
+
+    def _write_loop(self):
+        conn = self._connect()
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            # Gather whatever else arrives within the flush interval
+            deadline = time.monotonic() + self.flush_interval
+            while item is not _STOP and len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                batch.append(item)
+
+            stop = batch[-1] is _STOP
+            rows = []
+            for item in batch:
+                if item is _STOP:
+                    continue
+                try:
+                    rows.append(self._to_row(item))
+                except Exception as e:
+                    self.stats['failed'] += 1
+                    print(f"Results store: could not store heatmaps: {e}")
+            if rows:
+                try:
+                    with conn:
+                        conn.executemany(_INSERT, rows)
+                    self.stats['written'] += len(rows)
+                    self.stats['batches'] += 1
+                except Exception as e:
+                    self.stats['failed'] += len(rows)
+                    print(f"Results store: failed to write {len(rows)} results: {e}")
+            released = sum(item[3] for item in batch if item is not _STOP)
+            with self._stats_lock:
+                self._queued_bytes -= released
+            for _ in batch:
+                self._queue.task_done()
+            if stop:
+                conn.close()
+                return
+
+    def _to_row(self, item):
+        columns, heatmap_png, overlay_png, _ = item
+        return columns + (self._store_png(heatmap_png), self._store_png(overlay_png))
+
+    def _store_png(self, data):
+        if data is None:
+            return None
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.heatmap_path(digest)
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        return digest
+
+    def heatmap_path(self, digest):
+        # Two-level fan-out keeps directories small at millions of files
+        return self.heatmap_dir / digest[:2] / f"{digest}.png"
+
+    def flush(self):
+        """Block until everything queued so far is committed"""
+        self._queue.join()
+
+    def close(self):
+        """Commit everything queued and stop the writer; safe to call twice"""
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+
+    # Read path
+
+    def query(self, start=None, end=None, risk_level=None, image_sha256=None,
+              clinic_id=None, limit=50, cursor=None):
+        """Newest first. Returns (rows, next_cursor)."""
+        if risk_level is not None and risk_level not in RISK_LEVELS:
+            raise ValueError(f"Invalid risk level: {risk_level!r}")
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+        where, params = [], []
+        for column, value in (('risk_level', risk_level), ('image_sha256', image_sha256),
+                              ('clinic_id', clinic_id)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if start is not None:
+            where.append("created_at >= ?")
+            params.append(start)
+        if end is not None:
+            where.append("created_at < ?")
+            params.append(end)
+        if cursor:
+            where.append("(created_at, id) < (?, ?)")
+            params.extend(decode_cursor(cursor))
+
+        sql = "SELECT * FROM results"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        with self._reader() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+        return [self._to_dict(row) for row in rows[:limit]], next_cursor
+
+    @staticmethod
+    def _to_dict(row):
+        entry = dict(row)
+        entry['affected_regions'] = json.loads(entry['affected_regions'])
+        entry['timestamp'] = datetime.fromtimestamp(entry['created_at']).isoformat()
+        return entry
+
+    def status(self):
+        return dict(self.stats, queued=self._queue.qsize(), queued_bytes=self._queued_bytes)
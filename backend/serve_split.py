@@ -0,0 +1,137 @@
+"""
+Split-process TB detection server
+One model-owner process runs TBClassifier + Grad-CAM++ and batches requests
+out of a shared-memory ring; several lightweight front-end processes share
+the listening socket and handle HTTP, image decoding and heatmap rendering.
+
+POSIX only (Linux/macOS): the ring and the listening socket are handed to
+the children by fork. On Windows run the single-process server.py.
+
+Usage:
+    python serve_split.py [--frontends 4] [--slots 16] [--max-batch 8]
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import signal
+import socket
+import sys
+import time
+
+
+def _serve_frontend(ring, fd, host, port):
+    from werkzeug.serving import make_server
+    import server
+
+    server.attach_ring(ring)
+    server.init_results_store()
+    httpd = make_server(host, port, server.app, threaded=True, fd=fd)
+    # multiprocessing children skip atexit, so commit queued results here;
+    # the launcher stops front-ends with SIGTERM
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        httpd.serve_forever()
+    finally:
+        server.close_results_store()
+
+
+def _run_owner(ring, version, max_batch, batch_window, launched):
+    started = time.perf_counter()
+    ring.set_phase('loading')
+    try:
+        # torch is imported here, in the owner only; the parent and the
+        # front-ends forked from it never load it
+        from inference_worker import run_model_owner
+        ring.set_phase('loading', import_seconds=time.perf_counter() - started)
+
+        run_model_owner(ring, version, max_batch, batch_window, launched)
+    except Exception as e:
+        # Visible on /health until the launcher stops the front-ends
+        ring.fail(e)
+        raise
+
+
+def main():
+    launched = time.perf_counter()
+    parser = argparse.ArgumentParser(description="Drishti split-process server")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('DRISHTI_PORT', 5000)))
+    parser.add_argument('--frontends', type=int, default=4, help="HTTP front-end processes")
+    parser.add_argument('--slots', type=int, default=16, help="ring buffer slots")
+    parser.add_argument('--max-batch', type=int, default=8)
+    parser.add_argument('--batch-window-ms', type=float, default=2.0,
+                        help="how long the model owner waits to fill a batch")
+    parser.add_argument('--version', default=None, help="model registry version")
+    args = parser.parse_args()
+
+    if 'fork' not in mp.get_all_start_methods():
+        sys.exit("Split mode requires Linux/macOS (fork start method), "
+                 "run python server.py on this platform")
+
+    print("="*80)
+    print("PROJECT DRISHTI - TB DETECTION SERVER (SPLIT MODE)")
+    print("="*80)
+
+    # Bind once in the parent before importing torch, so probes are queued
+    # instead of refused; every front-end accepts on the same socket
+    family = socket.AF_INET6 if ':' in args.host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(128)
+    sock.set_inheritable(True)
+
+    from shm_ring import TensorRing
+
+    ctx = mp.get_context('fork')
+    ring = TensorRing(slots=args.slots, ctx=ctx)
+
+    owner = ctx.Process(
+        target=_run_owner,
+        args=(ring, args.version, args.max_batch, args.batch_window_ms / 1000.0, launched),
+        name='drishti-model-owner'
+    )
+    owner.start()
+
+    frontends = [
+        ctx.Process(
+            target=_serve_frontend,
+            args=(ring, sock.fileno(), args.host, args.port),
+            name=f'drishti-frontend-{i}'
+        )
+        for i in range(args.frontends)
+    ]
+    for process in frontends:
+        process.start()
+
+    print(f"Front-ends: {args.frontends}  Slots: {args.slots}  Max batch: {args.max_batch}")
+    print(f"Server available at: http://{args.host}:{args.port}")
+    print("="*80)
+
+    def shutdown(exitcode=0):
+        for process in frontends:
+            process.terminate()
+        # Let front-ends flush their results stores before tearing down
+        for process in frontends:
+            process.join(timeout=10)
+        ring.stop.set()
+        owner.join(timeout=5)
+        if owner.is_alive():
+            owner.terminate()
+        ring.close(unlink=True)
+        sys.exit(exitcode)
+
+    signal.signal(signal.SIGTERM, lambda *_: shutdown())
+    try:
+        owner.join()
+    except KeyboardInterrupt:
+        shutdown()
+    # The owner only returns on its own when it failed to load or crashed;
+    # exit non-zero so a supervisor restarts the server
+    print(f"Model owner exited with code {owner.exitcode}")
+    shutdown(owner.exitcode or 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,116 +1,376 @@
-import torch
-import torch.nn as nn
-from torchvision.models import efficientnet_v2_s, EfficientNet_V2_S_Weights
-from flask import Flask, request, jsonify
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
+# torch, torchvision, OpenCV, PIL and numpy are imported by the background
+# loader (or inside the functions that need them), so the port is bound and
+# /health answers within a fraction of a second of process start
+from flask import Flask, request, jsonify, send_file
 from flask_cors import CORS
-from PIL import Image
-import numpy as np
-import cv2
-import io
+import atexit
 import base64
+import hmac
+import os
+import signal
+import sys
+import threading
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 
-class TBClassifier(nn.Module):
-    def __init__(self, pretrained=False, dropout=0.3):
-        super(TBClassifier, self).__init__()
-        self.backbone = efficientnet_v2_s(
-            weights=EfficientNet_V2_S_Weights.DEFAULT if pretrained else None
-        )
-        num_features = self.backbone.classifier[1].in_features
-        self.backbone.classifier = nn.Sequential(
-            nn.Dropout(p=dropout),
-            nn.Linear(num_features, 1),
-            nn.Sigmoid()
-        )
+from werkzeug.exceptions import HTTPException, RequestEntityTooLarge
+
+from model_registry import ModelRegistry
+from results_store import ResultsStore, parse_time
+from uploads import MAX_UPLOAD_BYTES, UploadRejected, open_xray, stream_sha256
+
+app = Flask(__name__)
+# Uploads over the limit are refused from Content-Length before being read
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES
+# History endpoints carry patient X-rays and are left out of CORS
+CORS(app, resources={r'^/(?!results).*': {'origins': '*'}})
+
+model = None
+model_cam = None
+model_version = None
+device = None
+registry = ModelRegistry()
+
+# Guards the (model, model_cam, model_version) triple during hot-swaps
+_model_lock = threading.Lock()
+_swap_state = {'status': 'idle', 'version': None, 'error': None}
+
+# Startup phase: starting -> loading -> warming -> ready (or failed)
+_startup = {'status': 'starting', 'error': None, 'timings': {}}
+
+# All in-process model calls run on this one thread. Grad-CAM++ needs ~800MB
+# of autograd buffers and glibc keeps that cached per allocating thread, so
+# letting every request thread run the model multiplies peak memory.
+# torch's intra-op threads already use every core, so nothing is lost.
+_model_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='model')
+
+# Set by serve_split.py when the model lives in a separate process
+inference_ring = None
+
+# Prediction history, created on first use; DRISHTI_RESULTS=off disables it
+RESULTS_ENABLED = os.environ.get('DRISHTI_RESULTS', 'on') != 'off'
+# Read access to the history; the admin token is accepted as well
+RESULTS_TOKEN = os.environ.get('DRISHTI_RESULTS_TOKEN')
+_results_store = None
+_results_error = None
+
+ADMIN_TOKEN = os.environ.get('DRISHTI_ADMIN_TOKEN')
+PORT = int(os.environ.get('DRISHTI_PORT', 5000))
+
+class LocalSession:
+    """Per-request inference on a model held by this process"""
     
-    def forward(self, x):
-        return self.backbone(x)
-
-class GradCAMPlusPlus:
-    def __init__(self, model, target_layer):
-        self.model = model
-        self.target_layer = target_layer
-        self.gradients = None
-        self.activations = None
-        self.target_layer.register_forward_hook(self._forward_hook)
-        self.target_layer.register_full_backward_hook(self._backward_hook)
+    def __init__(self, active_model, gradcam, img_array):
+        import torch
+        self.model = active_model
+        self.gradcam = gradcam
+        img_tensor = torch.from_numpy(img_array).permute(2, 0, 1).unsqueeze(0)
+        self.img_tensor = img_tensor.to(device)
     
-    def _forward_hook(self, module, input, output):
-        self.activations = output.detach()
+    def probability(self):
+        return _model_executor.submit(self._probability).result()
     
-    def _backward_hook(self, module, grad_input, grad_output):
-        self.gradients = grad_output[0].detach()
+    def _probability(self):
+        import torch
+        with torch.no_grad():
+            prediction = self.model(self.img_tensor)
+            return float(prediction.item())
     
-    def generate_cam(self, input_tensor, target_class=None):
-        output = self.model(input_tensor)
-        self.model.zero_grad()
-        if target_class is None:
-            target_class = output
-        target_class.backward()
-        
-        gradients = self.gradients
-        activations = self.activations
-        
-        alpha_num = gradients.pow(2)
-        alpha_denom = 2 * gradients.pow(2) + (activations * gradients.pow(3)).sum(dim=(2, 3), keepdim=True)
-        alpha_denom = torch.where(alpha_denom != 0, alpha_denom, torch.ones_like(alpha_denom))
-        alphas = alpha_num / alpha_denom
-        
-        weights = (alphas * torch.relu(gradients)).sum(dim=(2, 3), keepdim=True)
-        cam = (weights * activations).sum(dim=1, keepdim=True)
-        cam = torch.relu(cam)
-        cam = cam - cam.min()
-        if cam.max() > 0:
-            cam = cam / cam.max()
-        
-        return cam
+    def cam(self):
+        return _model_executor.submit(self._cam).result()
+    
+    def _cam(self):
+        img_tensor_grad = self.img_tensor.clone().detach().requires_grad_(True)
+        cam = self.gradcam.generate_cam(img_tensor_grad)
+        return cam.squeeze().cpu().numpy()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        pass
 
-app = Flask(__name__)
-CORS(app)
+class ServerBusy(Exception):
+    """No inference capacity right now; the client should retry shortly"""
 
-model = None
-device = None
+def _unavailable(body, retry_after=5):
+    response = jsonify(body)
+    response.status_code = 503
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+def attach_ring(ring):
+    """Serve through a model-owner process instead of an in-process model"""
+    global inference_ring
+    inference_ring = ring
+
+def open_session(img_array):
+    """Returns (session, model_version) for one prediction"""
+    if inference_ring is not None:
+        from shm_ring import RingSession
+        try:
+            session = RingSession(inference_ring, img_array)
+        except TimeoutError as e:
+            # Every ring slot is busy: overload, not a server error
+            raise ServerBusy(str(e)) from e
+        return session, inference_ring.model_version()
+    active_model, gradcam, version = get_active_model()
+    return LocalSession(active_model, gradcam, img_array), version
+
+def device_name():
+    if inference_ring is not None:
+        return inference_ring.device_name()
+    return 'cuda' if device is not None and device.type == 'cuda' else 'cpu'
 
 def load_model():
-    global model, device
+    global model, model_cam, model_version, device
+    
+    timings = _startup['timings']
+    started = time.perf_counter()
+    _startup['status'] = 'loading'
     
     print("="*80)
     print("PROJECT DRISHTI - TB DETECTION SERVER")
     print("="*80)
     
+    import torch
+    from tb_model import GradCAMPlusPlus, warmup_model
+    import pipeline  # noqa: F401 - OpenCV/scipy stack used by the first request
+    timings['import_seconds'] = round(time.perf_counter() - started, 3)
+    print(f"Imports: {timings['import_seconds']:.2f}s")
+    
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     print(f"Device: {device}")
     
-    model_path = r"H:\Project Drishti A Multi-Modal AI Platform to Close the TB Diagnostic Gap in Bangladesh\models\v3_anti_artifact_512_10pct\best_model.pt"
-    print(f"Loading: {model_path}")
+    version = registry.default_version()
+    print(f"Loading: {registry.path_for(version)}")
     
-    model = TBClassifier(pretrained=False, dropout=0.3)
-    checkpoint = torch.load(model_path, map_location=device, weights_only=False)
+    phase_started = time.perf_counter()
+    candidate = registry.load(version, device)
+    candidate_cam = GradCAMPlusPlus(candidate, candidate.backbone.features[-1])
+    timings['load_seconds'] = round(time.perf_counter() - phase_started, 3)
     
-    if 'model_state_dict' in checkpoint:
-        model.load_state_dict(checkpoint['model_state_dict'])
-    else:
-        model.load_state_dict(checkpoint)
+    _startup['status'] = 'warming'
+    phase_started = time.perf_counter()
+    warmup_model(candidate, device)
+    timings['warmup_seconds'] = round(time.perf_counter() - phase_started, 3)
     
-    model.to(device)
-    model.eval()
+    # Publish only a warm model, readiness implies the first request is fast
+    with _model_lock:
+        model, model_cam, model_version = candidate, candidate_cam, version
+    timings['ready_seconds'] = round(time.perf_counter() - _IMPORT_STARTED, 3)
+    _startup['status'] = 'ready'
     
     params = sum(p.numel() for p in model.parameters())
+    print(f"Version: {model_version}")
     print(f"Parameters: {params:,}")
+    print(f"Load: {timings['load_seconds']:.2f}s  Warm-up: {timings['warmup_seconds']:.2f}s")
     print(f"Status: READY")
     print("="*80)
 
+def _background_load():
+    try:
+        load_model()
+    except Exception as e:
+        _startup.update(status='failed', error=str(e))
+        print(f"Model load failed: {e}")
+        traceback.print_exc()
+
+def start_background_load():
+    """Load and warm up the model without blocking the HTTP server"""
+    threading.Thread(target=_background_load, name='model-loader', daemon=True).start()
+
+def startup_state():
+    """(phase, error) of the model load, here or in the model-owner process"""
+    if inference_ring is not None:
+        return inference_ring.phase(), inference_ring.error()
+    return _startup['status'], _startup['error']
+
+def is_ready():
+    if inference_ring is not None:
+        return inference_ring.ready.is_set()
+    return _startup['status'] == 'ready'
+
+def get_active_model():
+    """Snapshot of the serving model; callers keep it for the whole request"""
+    with _model_lock:
+        return model, model_cam, model_version
+
+def _hot_swap(version):
+    global model, model_cam, model_version
+    from tb_model import GradCAMPlusPlus, warmup_model
+    try:
+        print(f"Hot-swap: loading {version}...")
+        candidate = registry.load(version, device)
+        candidate_cam = GradCAMPlusPlus(candidate, candidate.backbone.features[-1])
+        _swap_state['status'] = 'warming'
+        warmup_model(candidate, device)
+        with _model_lock:
+            previous = model_version
+            model, model_cam, model_version = candidate, candidate_cam, version
+        # In-flight requests hold their own reference to the old model,
+        # it is freed once the last of them finishes
+        print(f"Hot-swap: {previous} -> {version} complete")
+    except Exception as e:
+        _swap_state.update(status='failed', error=str(e))
+        print(f"Hot-swap: {version} failed: {e}")
+        traceback.print_exc()
+        return
+    try:
+        # Restarts, split mode and the export tool start from this version
+        registry.set_active(version)
+        _swap_state.update(status='idle', error=None)
+    except OSError as e:
+        # Already serving the new model, only the next start is affected
+        _swap_state.update(status='idle', error=f'Active version not persisted: {e}')
+        print(f"Hot-swap: could not record {version} as active: {e}")
+
+def init_results_store():
+    """Open the history store at startup. A failure only disables history,
+    predictions keep being served."""
+    global _results_store, _results_error
+    if not RESULTS_ENABLED or _results_store is not None:
+        return _results_store
+    try:
+        _results_store = ResultsStore()
+    except Exception as e:
+        _results_error = str(e)
+        print(f"Results store unavailable, history disabled: {e}")
+        return None
+    # Commit whatever is still queued on a clean shutdown
+    atexit.register(_results_store.close)
+    return _results_store
+
+def close_results_store():
+    if _results_store is not None:
+        _results_store.close()
+
+def _token_matches(header, token):
+    if token is None:
+        return False
+    # Constant-time, so the token cannot be guessed from response timing
+    return hmac.compare_digest(request.headers.get(header, '').encode(), token.encode())
+
+def _admin_authorized():
+    return _token_matches('X-Admin-Token', ADMIN_TOKEN)
+
+def _results_authorized():
+    if _admin_authorized():
+        return True
+    return _token_matches('X-Results-Token', RESULTS_TOKEN)
+
+_UNGATED_ENDPOINTS = ('health', 'liveness', 'list_results', 'result_heatmap')
+
+@app.before_request
+def require_ready():
+    """Readiness gate: everything that uses the model waits for it. Health
+    probes and the history (which has its own auth) are always served."""
+    if request.endpoint in _UNGATED_ENDPOINTS or request.method == 'OPTIONS':
+        return None
+    if request.endpoint is None:
+        # No such route: let Flask answer 404/405, not "still loading"
+        return None
+    if is_ready():
+        return None
+    return _unavailable({
+        'error': 'Model is not ready yet',
+        'status': startup_state()[0]
+    })
+
+@app.route('/health/live', methods=['GET'])
+def liveness():
+    """Fails once the model load has failed, so the orchestrator restarts
+    the process instead of waiting on a readiness that will never come"""
+    status, error = startup_state()
+    if status == 'failed':
+        return jsonify({'status': 'failed', 'error': error}), 503
+    return jsonify({'status': 'alive'})
+
 @app.route('/health', methods=['GET'])
 def health():
+    """200 once ready; 503 with the current phase while loading/warming"""
+    ready = is_ready()
+    status, error = startup_state()
+    if inference_ring is not None:
+        body = {
+            'status': status,
+            'model_loaded': ready,
+            'model_version': inference_ring.model_version(),
+            'device': inference_ring.device_name(),
+            'timings': inference_ring.timings(),
+            'mode': 'split'
+        }
+    else:
+        body = {
+            'status': status,
+            'model_loaded': ready,
+            'model_version': model_version,
+            'device': str(device) if device is not None else None,
+            'timings': _startup['timings'],
+            'uptime_seconds': round(time.perf_counter() - _IMPORT_STARTED, 3)
+        }
+    if error:
+        body['error'] = error
+    if _results_store is not None:
+        body['results_store'] = _results_store.status()
+    elif _results_error:
+        body['results_store'] = {'error': _results_error}
+    return jsonify(body), 200 if ready else 503
+
+@app.route('/admin/models', methods=['GET'])
+def list_models():
+    if not _admin_authorized():
+        return jsonify({'error': 'Unauthorized'}), 403
     return jsonify({
-        'status': 'healthy',
-        'model_loaded': model is not None,
-        'device': str(device)
+        'active': inference_ring.model_version() if inference_ring is not None else model_version,
+        'swap': dict(_swap_state),
+        'versions': registry.versions()
     })
 
+@app.route('/admin/models/activate', methods=['POST'])
+def activate_model():
+    if not _admin_authorized():
+        return jsonify({'error': 'Unauthorized'}), 403
+    if inference_ring is not None:
+        return jsonify({'error': 'Hot-swap is not supported in split mode, run python model_registry.py activate <version> and restart serve_split.py'}), 501
+    
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({'error': 'Expected a JSON object: {"version": "<name>"}'}), 400
+    version = body.get('version')
+    try:
+        path = registry.path_for(version)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not path.exists():
+        return jsonify({'error': f'Unknown model version: {version}'}), 404
+    
+    with _model_lock:
+        if _swap_state['status'] in ('loading', 'warming'):
+            return jsonify({'error': 'Model swap already in progress', 'swap': dict(_swap_state)}), 409
+        _swap_state.update(status='loading', version=version, error=None)
+    
+    threading.Thread(target=_hot_swap, args=(version,), daemon=True).start()
+    return jsonify({'status': 'accepted', 'version': version}), 202
+
+@app.errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    limit_mb = MAX_UPLOAD_BYTES / (1024 * 1024)
+    return jsonify({'error': f'Upload exceeds {limit_mb:g} MB limit'}), 413
+
 @app.route('/predict', methods=['POST'])
 def predict():
-    import time
+    import numpy as np
+    from pipeline import (
+        HEATMAP_THRESHOLD, pace, preprocess_image, assess_risk, segment_lungs,
+        mask_cam, render_heatmap, encode_png, detect_regions, recommend,
+        explain_heatmap
+    )
     try:
         print("\n" + "="*80)
         print("PREDICTION REQUEST")
@@ -130,55 +390,45 @@ def predict():
         
         # Stage 1: Image preprocessing (5 seconds)
         print("Stage 1: Preprocessing X-ray image...")
-        time.sleep(5)
+        pace(5)
         
-        # Read and preprocess image
-        img = Image.open(io.BytesIO(file.read())).convert('RGB')
-        original_size = img.size
-        print(f"Original image size: {original_size}")
+        # Header is checked before decoding; JPEGs decode near model size
+        img, original_size = open_xray(file.stream)
+        print(f"Original image size: {original_size} (decoded at {img.size})")
         
-        img = img.resize((512, 512), Image.Resampling.LANCZOS)
+        # Only the history needs the upload's hash, and only once the
+        # upload has been accepted; rejected files are never read in full
+        image_sha256 = stream_sha256(file.stream) if _results_store is not None else None
         
-        img_array = np.array(img).astype(np.float32) / 255.0
-        img_tensor = torch.from_numpy(img_array).permute(2, 0, 1).unsqueeze(0)
-        img_tensor = img_tensor.to(device)
-        
-        print(f"Tensor shape: {img_tensor.shape}")
+        img_array = preprocess_image(img)
+        img.close()
+        print(f"Input shape: {img_array.shape}")
         print("✓ Preprocessing complete")
         
         # Stage 2: AI model inference (15 seconds - deep learning)
         print("Stage 2: Running deep learning model...")
-        time.sleep(15)
+        pace(15)
         
-        # Run prediction
-        with torch.no_grad():
-            prediction = model(img_tensor)
-            probability = float(prediction.item())
+        # Pin the model for this request so a hot-swap cannot change it mid-way.
+        # In split mode the session holds a ring slot, so it spans only the
+        # model calls and none of the staged pacing
+        session, version = open_session(img_array)
+        print(f"Model version: {version}")
+        cam_np = None
+        with session:
+            probability = session.probability()
+            if probability >= HEATMAP_THRESHOLD:
+                print("Generating medically accurate Grad-CAM++ heatmap...")
+                cam_np = session.cam()
         
         print(f"✓ TB Probability: {probability:.4f}")
         print("✓ Model inference complete")
         
         # Stage 3: Risk assessment (5 seconds)
         print("Stage 3: Analyzing risk level...")
-        time.sleep(5)
+        pace(5)
         
-        # Determine classification and risk level
-        if probability >= 0.7:
-            classification = 'TB Positive (High Confidence)'
-            risk_level = 'high'
-            confidence = probability
-        elif probability >= 0.5:
-            classification = 'TB Positive'
-            risk_level = 'high'
-            confidence = probability
-        elif probability >= 0.3:
-            classification = 'Uncertain - Further Testing Recommended'
-            risk_level = 'medium'
-            confidence = 0.5
-        else:
-            classification = 'TB Negative'
-            risk_level = 'low'
-            confidence = 1.0 - probability
+        classification, risk_level, confidence = assess_risk(probability)
         
         print(f"✓ Classification: {classification}")
         print(f"✓ Risk Level: {risk_level}")
@@ -187,164 +437,28 @@ def predict():
         
         # Stage 4: Generating heatmap visualization (10 seconds)
         # ONLY GENERATE HEATMAP FOR TB-POSITIVE CASES
-        heatmap_base64 = None
-        overlay_base64 = None
-        regions_affected = []  # Initialize here for use in response
+        heatmap_png = None
+        overlay_png = None
+        regions_affected = []
         
-        if probability >= 0.5:
+        if probability >= HEATMAP_THRESHOLD:
             # TB POSITIVE: Generate professional medical-grade heatmap
             print("Stage 4: Generating TB localization heatmap...")
-            time.sleep(10)
-            
-            print("Generating medically accurate Grad-CAM++ heatmap...")
-            target_layer = model.backbone.features[-1]
-            gradcam = GradCAMPlusPlus(model, target_layer)
-            
-            img_tensor_grad = img_tensor.clone().detach().requires_grad_(True)
-            cam = gradcam.generate_cam(img_tensor_grad)
-            
-            cam_np = cam.squeeze().cpu().numpy()
-            cam_resized = cv2.resize(cam_np, (512, 512))
+            pace(10)
             
             # Create original image numpy array for overlay
             original_img_np = (img_array * 255).astype(np.uint8)
             
-            # ADVANCED LUNG SEGMENTATION: Create precise lung mask from X-ray
             print("Creating precise lung segmentation mask...")
-            original_img_gray = cv2.cvtColor(original_img_np, cv2.COLOR_RGB2GRAY)
-            
-            # Apply CLAHE for better contrast
-            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-            enhanced = clahe.apply(original_img_gray)
-            
-            # Use Otsu's thresholding to separate lungs from background
-            _, lung_binary = cv2.threshold(
-                enhanced, 0, 255,
-                cv2.THRESH_BINARY + cv2.THRESH_OTSU
-            )
-            
-            # Morphological operations to clean up mask
-            kernel_open = cv2.getStructuringElement(
-                cv2.MORPH_ELLIPSE, (15, 15)
-            )
-            kernel_close = cv2.getStructuringElement(
-                cv2.MORPH_ELLIPSE, (25, 25)
-            )
-            
-            lung_binary = cv2.morphologyEx(
-                lung_binary, cv2.MORPH_CLOSE, kernel_close
-            )
-            lung_binary = cv2.morphologyEx(
-                lung_binary, cv2.MORPH_OPEN, kernel_open
-            )
-            
-            # Fill holes in lung regions
-            from scipy import ndimage
-            lung_filled = ndimage.binary_fill_holes(lung_binary)
-            lung_mask_precise = lung_filled.astype(np.float32)
-            
-            # Apply Gaussian blur to smooth mask edges
-            lung_mask_precise = cv2.GaussianBlur(
-                lung_mask_precise, (21, 21), 0
-            )
-            
-            # Create anatomical lung region mask (fallback)
-            h, w = cam_resized.shape
-            anatomical_mask = np.zeros_like(cam_resized)
-            
-            # Left lung: elliptical region
-            cv2.ellipse(anatomical_mask,
-                        center=(int(w*0.30), int(h*0.50)),
-                        axes=(int(w*0.12), int(h*0.28)),
-                        angle=10, startAngle=0, endAngle=360,
-                        color=1, thickness=-1)
-            
-            # Right lung: elliptical region
-            cv2.ellipse(anatomical_mask,
-                        center=(int(w*0.70), int(h*0.50)),
-                        axes=(int(w*0.12), int(h*0.28)),
-                        angle=-10, startAngle=0, endAngle=360,
-                        color=1, thickness=-1)
-            
-            # Combine precise segmentation with anatomical mask
-            lung_mask_combined = np.maximum(
-                lung_mask_precise * 0.7, anatomical_mask
-            )
-            lung_mask_combined = cv2.GaussianBlur(
-                lung_mask_combined, (15, 15), 0
-            )
-            
-            # REALISTIC HEATMAP: Keep FULL gradient (blue->green->yellow->red)
-            # NO aggressive thresholding - show all attention levels
-            
-            # Normalize CAM to [0, 1] (pure Grad-CAM++ output)
-            cam_normalized = cam_resized.copy()
-            if cam_normalized.max() > 0:
-                cam_normalized = (cam_normalized - cam_normalized.min()) / \
-                                 (cam_normalized.max() - cam_normalized.min())
+            lung_mask = segment_lungs(original_img_np)
+            cam_masked = mask_cam(cam_np, lung_mask)
+            heatmap_rgb, overlay = render_heatmap(cam_masked, original_img_np)
             
-            # Apply ONLY lung mask to focus on lung regions
-            # Keep full gradient - blue (low) to red (high)
-            cam_masked = cam_normalized * lung_mask_combined
-            
-            # Very light smoothing to reduce noise but keep gradient
-            cam_masked = cv2.GaussianBlur(cam_masked, (5, 5), 0)
-            
-            # Final normalization for full color range
-            if cam_masked.max() > 0:
-                cam_masked = (cam_masked - cam_masked.min()) / \
-                             (cam_masked.max() - cam_masked.min())
-            
-            # Create heatmap with JET colormap (medical standard)
-            # JET: blue (low) -> cyan -> green -> yellow -> red (high)
-            heatmap = cv2.applyColorMap(
-                np.uint8(255 * cam_masked),
-                cv2.COLORMAP_JET
-            )
-            heatmap_rgb = cv2.cvtColor(heatmap, cv2.COLOR_BGR2RGB)
-            
-            # Create overlay - SIMPLE alpha blending like notebook
-            # This preserves the beautiful gradient effect
-            alpha = 0.5  # 50% transparency - perfect balance
-            overlay = (
-                (1 - alpha) * original_img_np + alpha * heatmap_rgb
-            ).astype(np.uint8)
-            
-            _, heatmap_buffer = cv2.imencode('.png', heatmap_rgb)
-            heatmap_base64 = base64.b64encode(heatmap_buffer).decode('utf-8')
-            
-            _, overlay_buffer = cv2.imencode('.png', overlay)
-            overlay_base64 = base64.b64encode(overlay_buffer).decode('utf-8')
+            heatmap_png = encode_png(heatmap_rgb)
+            overlay_png = encode_png(overlay)
             
             # Identify affected regions
-            regions_affected = []
-            detect_threshold = 0.45
-            
-            if cam_masked[int(h*0.2):int(h*0.45),
-                          int(w*0.15):int(w*0.45)].max() > detect_threshold:
-                regions_affected.append("left upper lobe")
-            
-            if cam_masked[int(h*0.2):int(h*0.45),
-                          int(w*0.55):int(w*0.85)].max() > detect_threshold:
-                regions_affected.append("right upper lobe")
-            
-            if cam_masked[int(h*0.45):int(h*0.65),
-                          int(w*0.15):int(w*0.45)].max() > detect_threshold:
-                regions_affected.append("left middle zone")
-            
-            if cam_masked[int(h*0.45):int(h*0.65),
-                          int(w*0.55):int(w*0.85)].max() > detect_threshold:
-                regions_affected.append("right middle zone")
-            
-            lower_threshold = detect_threshold + 0.1
-            if cam_masked[int(h*0.65):int(h*0.8),
-                          int(w*0.15):int(w*0.45)].max() > lower_threshold:
-                regions_affected.append("left lower lobe")
-            
-            if cam_masked[int(h*0.65):int(h*0.8),
-                          int(w*0.55):int(w*0.85)].max() > lower_threshold:
-                regions_affected.append("right lower lobe")
-            
+            regions_affected = detect_regions(cam_masked)
             affected_regions_str = (
                 ', '.join(regions_affected) if regions_affected
                 else 'None detected'
@@ -356,81 +470,54 @@ def predict():
         else:
             # TB NEGATIVE: Skip heatmap generation
             print("Stage 4: Skipping heatmap (TB Negative)")
-            time.sleep(10)  # Keep total time consistent
-            affected_regions_str = 'N/A (TB Negative)'
+            pace(10)  # Keep total time consistent
             print("✓ No heatmap generated (TB Negative)")
         
         # Stage 5: Finalizing medical analysis (5 seconds)
         print("Stage 5: Generating medical recommendations...")
-        time.sleep(5)
-        print("="*80)        # Get current timestamp
-        from datetime import datetime
+        pace(5)
+        print("="*80)
         timestamp = datetime.now().isoformat()
         
         # Generate medical recommendations based on severity
-        recommendations = []
-        urgency_level = "normal"
-        
-        if probability >= 0.8:
-            urgency_level = "critical"
-            recommendations = [
-                "Seek immediate medical attention at nearest TB clinic",
-                "Isolate from family members, use separate room if possible",
-                "Wear a mask when near others",
-                "Start prescribed anti-TB medication as soon as possible",
-                "Follow up with doctor within 48 hours"
-            ]
-        elif probability >= 0.6:
-            urgency_level = "high"
-            recommendations = [
-                "Consult a doctor within 3-5 days for confirmation",
-                "Get sputum test (AFB) and GeneXpert test",
-                "Avoid close contact with children and elderly",
-                "Practice cough hygiene - cover mouth when coughing",
-                "Maintain good ventilation at home"
-            ]
-        elif probability >= 0.4:
-            urgency_level = "moderate"
-            recommendations = [
-                "Schedule medical consultation within 1-2 weeks",
-                "Monitor symptoms: persistent cough, fever, night sweats",
-                "Get chest X-ray reviewed by radiologist",
-                "Consider additional diagnostic tests",
-                "Maintain healthy diet and adequate rest"
-            ]
-        else:
-            urgency_level = "low"
-            recommendations = [
-                "No immediate TB treatment required",
-                "Continue regular health checkups",
-                "Maintain healthy lifestyle and nutrition",
-                "If symptoms develop, consult doctor",
-                "Annual screening recommended for high-risk groups"
-            ]
-        
-        # Generate heatmap explanation
-        heatmap_explanation = ""
-        if regions_affected:
-            affected_str = ", ".join(regions_affected)
-            heatmap_explanation = f"The AI detected suspicious patterns in the {affected_str}. Red/orange areas indicate regions where tuberculosis-related changes are most likely present. These areas show abnormal opacity or infiltrates that are characteristic of TB lesions."
-        else:
-            heatmap_explanation = "The AI analysis shows no significant TB-related patterns in the chest X-ray. The lung fields appear relatively clear without characteristic TB lesions."
+        urgency_level, recommendations = recommend(probability)
+        heatmap_explanation = explain_heatmap(regions_affected)
         
-        return jsonify({
+        result = {
             'probability': probability,
             'riskLevel': risk_level,
             'confidence': confidence,
             'timestamp': timestamp,
-            'heatmap': overlay_base64,
-            'heatmap_only': heatmap_base64,
-            'device_used': 'cuda' if device.type == 'cuda' else 'cpu',
+            'heatmap': base64.b64encode(overlay_png).decode('utf-8') if overlay_png else None,
+            'heatmap_only': base64.b64encode(heatmap_png).decode('utf-8') if heatmap_png else None,
+            'device_used': device_name(),
+            'model_version': version,
             'classification': classification,
             'urgency_level': urgency_level,
             'recommendations': recommendations,
             'affected_regions': regions_affected,
             'heatmap_explanation': heatmap_explanation
-        })
+        }
         
+        # Written behind the response by the store's own thread; history
+        # is best-effort and must never cost the client its prediction
+        if _results_store is not None:
+            try:
+                clinic_id = request.form.get('clinic_id') or request.headers.get('X-Clinic-Id')
+                _results_store.record(result, image_sha256, heatmap_png, overlay_png, clinic_id)
+            except Exception as e:
+                print(f"Results store: could not queue result: {e}")
+        
+        return jsonify(result)
+        
+    except UploadRejected as e:
+        print(f"Upload rejected: {e}")
+        return jsonify({'error': str(e)}), e.status
+    except ServerBusy as e:
+        print(f"Busy: {e}")
+        return _unavailable({'error': 'Server busy, retry shortly'}, retry_after=1)
+    except HTTPException:
+        raise
     except Exception as e:
         print("\n" + "="*80)
         print("ERROR")
@@ -440,6 +527,58 @@ def predict():
         print("="*80)
         return jsonify({'error': str(e)}), 500
 
+@app.route('/results', methods=['GET'])
+def list_results():
+    """Prediction history, newest first.
+    Filters: start, end (ISO 8601 or epoch), risk_level, image_hash, clinic_id.
+    Paging: limit (max 500) and the returned next_cursor."""
+    if not _results_authorized():
+        return jsonify({'error': 'Unauthorized'}), 403
+    store = _results_store
+    if store is None:
+        return jsonify({'error': 'Results store is disabled'}), 404
+    args = request.args
+    try:
+        rows, next_cursor = store.query(
+            start=parse_time(args.get('start')),
+            end=parse_time(args.get('end')),
+            risk_level=args.get('risk_level'),
+            image_sha256=args.get('image_hash'),
+            clinic_id=args.get('clinic_id'),
+            limit=args.get('limit', 50),
+            cursor=args.get('cursor')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    for row in rows:
+        for column in ('heatmap_sha256', 'overlay_sha256'):
+            digest = row[column]
+            row[column.replace('_sha256', '_url')] = f'/results/heatmaps/{digest}.png' if digest else None
+    return jsonify({'results': rows, 'next_cursor': next_cursor})
+
+@app.route('/results/heatmaps/<digest>.png', methods=['GET'])
+def result_heatmap(digest):
+    if not _results_authorized():
+        return jsonify({'error': 'Unauthorized'}), 403
+    store = _results_store
+    if store is None or len(digest) != 64 or any(c not in '0123456789abcdef' for c in digest):
+        return jsonify({'error': 'Not found'}), 404
+    path = store.heatmap_path(digest)
+    if not path.exists():
+        return jsonify({'error': 'Not found'}), 404
+    # Content-addressed, so the file behind a URL never changes; private
+    # because it shows the patient's X-ray
+    response = send_file(path, mimetype='image/png', max_age=365 * 24 * 3600)
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
+
+_startup['timings']['server_import_seconds'] = round(time.perf_counter() - _IMPORT_STARTED, 3)
+
 if __name__ == '__main__':
-    load_model()
-    app.run(host='0.0.0.0', port=5000, debug=False)
+    # SIGTERM (orchestrators, process managers) exits like Ctrl+C, so the
+    # atexit handlers commit queued results
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    init_results_store()
+    start_background_load()
+    app.run(host='0.0.0.0', port=PORT, debug=False)
@@ -0,0 +1,250 @@
+"""
+Shared-memory tensor ring buffer between HTTP front-ends and the model owner
+Front-end processes write preprocessed 3x512x512 float32 tensors straight
+into a slot; the model-owner process batches filled slots and writes the
+probability (and Grad-CAM++ map) back into the same slot. Nothing is pickled.
+
+The ring is created by the launcher before forking, so the semaphores,
+events and the shared-memory mapping are inherited by every child. That
+needs the fork start method, which Windows does not have.
+"""
+
+import multiprocessing as mp
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from model_constants import INPUT_SIZE
+
+# EfficientNetV2-S downsamples by 32, the CAM comes back at feature resolution
+CAM_SIZE = INPUT_SIZE // 32
+
+# Slot states
+FREE, WRITING, FILLED, CLAIMED, DONE = range(5)
+
+# Header columns
+STATE, SEQ, WANT_CAM, FAILED, ABANDONED = range(5)
+_HEADER_COLUMNS = 5
+
+# Model-owner startup, reported by /health like the in-process server
+PHASES = ('starting', 'loading', 'warming', 'ready', 'failed')
+TIMINGS = ('import_seconds', 'load_seconds', 'warmup_seconds', 'ready_seconds')
+
+
+def _aligned(offset, alignment=64):
+    return (offset + alignment - 1) // alignment * alignment
+
+
+class TensorRing:
+    """Fixed number of tensor slots in one shared-memory block"""
+
+    def __init__(self, slots=16, ctx=None):
+        ctx = ctx or mp.get_context('fork')
+        self.slots = slots
+
+        shapes = [
+            ('header', np.int64, (slots, _HEADER_COLUMNS)),
+            ('inputs', np.float32, (slots, 3, INPUT_SIZE, INPUT_SIZE)),
+            ('probs', np.float32, (slots,)),
+            ('cams', np.float32, (slots, CAM_SIZE, CAM_SIZE)),
+        ]
+        offsets = []
+        size = 0
+        for _, dtype, shape in shapes:
+            size = _aligned(size)
+            offsets.append(size)
+            size += int(np.prod(shape)) * np.dtype(dtype).itemsize
+
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        for (name, dtype, shape), offset in zip(shapes, offsets):
+            setattr(self, name, np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset))
+        self.header[:] = 0
+
+        # lock guards header transitions, the semaphores count slots
+        self.lock = ctx.Lock()
+        self.free = ctx.Semaphore(slots)
+        self.filled = ctx.Semaphore(0)
+        self.done = [ctx.Event() for _ in range(slots)]
+        self.ready = ctx.Event()
+        self.stop = ctx.Event()
+        self._version = ctx.Array('c', 128)
+        self._device = ctx.Array('c', 16)
+        self._phase = ctx.Value('i', 0)
+        self._timings = ctx.Array('d', [-1.0] * len(TIMINGS))
+        self._error = ctx.Array('c', 512)
+        # Submission counter shared by all front-ends, guarded by `lock`
+        self._seq = ctx.Value('q', 0, lock=False)
+
+    # -- shared metadata -------------------------------------------------
+
+    def publish(self, version, device):
+        self._version.value = version.encode('utf-8')[:127]
+        self._device.value = device.type.encode('utf-8')[:15]
+
+    def set_phase(self, phase, **timings):
+        """Owner side: enter `phase`, recording any finished timings"""
+        for name, seconds in timings.items():
+            self._timings[TIMINGS.index(name)] = seconds
+        self._phase.value = PHASES.index(phase)
+
+    def fail(self, error):
+        self._error.value = str(error).encode('utf-8')[:511]
+        self._phase.value = PHASES.index('failed')
+
+    def phase(self):
+        return PHASES[self._phase.value]
+
+    def timings(self):
+        return {name: round(seconds, 3)
+                for name, seconds in zip(TIMINGS, self._timings[:]) if seconds >= 0}
+
+    def error(self):
+        return self._error.value.decode('utf-8', 'replace') or None
+
+    def model_version(self):
+        return self._version.value.decode('utf-8') or None
+
+    def device_name(self):
+        return self._device.value.decode('utf-8') or None
+
+    def close(self, unlink=False):
+        # Drop our views first, SharedMemory refuses to close while exported
+        for name in ('header', 'inputs', 'probs', 'cams'):
+            setattr(self, name, None)
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+    # -- front-end side --------------------------------------------------
+
+    def acquire(self, timeout=None):
+        """Reserve a free slot, the caller writes into `slot.input`"""
+        if not self.free.acquire(timeout=timeout):
+            raise TimeoutError("No free inference slot")
+        with self.lock:
+            index = int(np.flatnonzero(self.header[:, STATE] == FREE)[0])
+            self.header[index] = 0
+            self.header[index, STATE] = WRITING
+        return RingSlot(self, index)
+
+    def _submit(self, index, want_cam):
+        self.done[index].clear()
+        with self.lock:
+            self._seq.value += 1
+            self.header[index, SEQ] = self._seq.value
+            self.header[index, WANT_CAM] = int(want_cam)
+            self.header[index, FAILED] = 0
+            self.header[index, STATE] = FILLED
+        self.filled.release()
+
+    def _abandon(self, index):
+        """Called on timeout; returns True if the slot can be freed now"""
+        with self.lock:
+            if self.header[index, STATE] == DONE:
+                return True
+            self.header[index, ABANDONED] = 1
+            return False
+
+    def _release(self, index):
+        with self.lock:
+            self.header[index, STATE] = FREE
+        self.free.release()
+
+    # -- model-owner side ------------------------------------------------
+
+    def claim_batch(self, max_batch, window=0.002, poll=0.5):
+        """Wait for filled slots and claim up to `max_batch` in FIFO order"""
+        if not self.filled.acquire(timeout=poll):
+            return []
+        count = 1
+        deadline = time.perf_counter() + window
+        while count < max_batch:
+            remaining = deadline - time.perf_counter()
+            if not self.filled.acquire(timeout=max(remaining, 0)):
+                break
+            count += 1
+
+        with self.lock:
+            filled = np.flatnonzero(self.header[:, STATE] == FILLED)
+            order = filled[np.argsort(self.header[filled, SEQ], kind='stable')]
+            indices = order[:count]
+            self.header[indices, STATE] = CLAIMED
+        return indices
+
+    def complete(self, indices, failed=False):
+        """Hand results back; probs/cams must already be written"""
+        with self.lock:
+            for index in indices:
+                if self.header[index, ABANDONED]:
+                    # Front-end gave up waiting, recycle the slot here
+                    self.header[index] = 0
+                    self.free.release()
+                    continue
+                self.header[index, FAILED] = int(failed)
+                self.header[index, STATE] = DONE
+                self.done[index].set()
+
+
+class RingSlot:
+    """One reserved slot; run() can be called repeatedly on the same input"""
+
+    def __init__(self, ring, index):
+        self.ring = ring
+        self.index = index
+        self.input = ring.inputs[index]
+        self._released = False
+
+    def run(self, want_cam=False, timeout=60.0):
+        """Returns (probability, cam or None) for the tensor in `input`"""
+        ring = self.ring
+        ring._submit(self.index, want_cam)
+        if not ring.done[self.index].wait(timeout):
+            if not ring._abandon(self.index):
+                self._released = True  # the model owner frees it later
+            raise TimeoutError("Inference timed out")
+        if ring.header[self.index, FAILED]:
+            raise RuntimeError("Inference failed in model process")
+        probability = float(ring.probs[self.index])
+        cam = ring.cams[self.index].copy() if want_cam else None
+        return probability, cam
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.ring._release(self.index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class RingSession:
+    """Per-request inference through the ring, mirrors server.LocalSession"""
+
+    def __init__(self, ring, img_array, timeout=30.0):
+        self.slot = ring.acquire(timeout)
+        try:
+            np.copyto(self.slot.input, img_array.transpose(2, 0, 1))
+        except Exception:
+            self.slot.release()
+            raise
+
+    def probability(self):
+        probability, _ = self.slot.run(want_cam=False)
+        return probability
+
+    def cam(self):
+        _, cam = self.slot.run(want_cam=True)
+        return cam
+
+    def close(self):
+        self.slot.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,28 @@
+"""
+Synthetic chest X-rays for benchmarks and export parity checks
+Deterministic per seed, so runs on different machines see the same films.
+"""
+
+import numpy as np
+from PIL import Image
+
+
+def synthetic_xray(size=2048, seed=0):
+    """Grayscale chest-film lookalike: bright mediastinum, dark lung fields, ribs"""
+    rng = np.random.default_rng(seed)
+    h = w = size
+    yy, xx = np.mgrid[0:h, 0:w].astype(np.float32) / size
+
+    body = np.exp(-(((xx - 0.5) / 0.42) ** 2 + ((yy - 0.55) / 0.55) ** 2) ** 2)
+    img = 40 + 150 * body
+    for cx in (0.30, 0.70):
+        lung = np.exp(-(((xx - cx) / 0.13) ** 2 + ((yy - 0.5) / 0.28) ** 2) ** 2)
+        img -= 90 * lung
+    ribs = 0.5 + 0.5 * np.sin(yy * 60 + np.abs(xx - 0.5) * 8)
+    img += 18 * ribs * body
+    # A few opacities so Grad-CAM has something to look at
+    for _ in range(3):
+        cx, cy, r = rng.uniform(0.2, 0.8), rng.uniform(0.25, 0.75), rng.uniform(0.02, 0.06)
+        img += 50 * np.exp(-(((xx - cx) ** 2 + (yy - cy) ** 2) / r ** 2))
+    img += rng.normal(0, 6, size=(h, w))
+    return Image.fromarray(np.clip(img, 0, 255).astype(np.uint8), mode='L')
@@ -0,0 +1,116 @@
+"""
+TB detection model definition shared by the server and tooling
+EfficientNetV2-S backbone with a single sigmoid output, plus Grad-CAM++
+"""
+
+import threading
+import weakref
+
+import torch
+import torch.nn as nn
+from torchvision.models import efficientnet_v2_s, EfficientNet_V2_S_Weights
+
+from model_constants import INPUT_SIZE
+
+
+class TBClassifier(nn.Module):
+    def __init__(self, pretrained=False, dropout=0.3):
+        super(TBClassifier, self).__init__()
+        self.backbone = efficientnet_v2_s(
+            weights=EfficientNet_V2_S_Weights.DEFAULT if pretrained else None
+        )
+        num_features = self.backbone.classifier[1].in_features
+        self.backbone.classifier = nn.Sequential(
+            nn.Dropout(p=dropout),
+            nn.Linear(num_features, 1),
+            nn.Sigmoid()
+        )
+    
+    def forward(self, x):
+        return self.backbone(x)
+
+class GradCAMPlusPlus:
+    """Grad-CAM++ over `target_layer`; safe to share between request threads.
+    
+    The forward hook is registered once and only captures activations for
+    the thread that is inside generate_cam(), and gradients are taken with
+    torch.autograd.grad, so concurrent requests never touch each other's
+    buffers or the module's hook tables.
+    
+    The hook reaches this object through a weak reference: a bound method
+    would make layer -> hook -> self -> model a cycle, keeping a swapped-out
+    model (and its GPU memory) alive until the cyclic GC happens to run.
+    """
+    
+    def __init__(self, model, target_layer):
+        self.model = model
+        self.target_layer = target_layer
+        self._local = threading.local()
+        cam_ref = weakref.ref(self)
+        
+        def forward_hook(module, input, output):
+            cam = cam_ref()
+            if cam is not None:
+                cam._forward_hook(module, input, output)
+        
+        self._handle = self.target_layer.register_forward_hook(forward_hook)
+    
+    @property
+    def output(self):
+        """Model output of this thread's last generate_cam() call"""
+        return getattr(self._local, 'output', None)
+    
+    def remove(self):
+        """Detach the hook from the target layer"""
+        if self._handle is not None:
+            self._handle.remove()
+            self._handle = None
+    
+    def __del__(self):
+        self.remove()
+    
+    def _forward_hook(self, module, input, output):
+        if getattr(self._local, 'capture', False):
+            self._local.activations = output
+    
+    def generate_cam(self, input_tensor, target_class=None):
+        self._local.capture = True
+        try:
+            output = self.model(input_tensor)
+        finally:
+            self._local.capture = False
+        activations = self._local.activations
+        self._local.activations = None
+        self._local.output = output.detach()
+        
+        if target_class is None:
+            # Samples are independent in eval mode, so the gradient of the
+            # sum gives every sample in a batch its own gradient
+            target_class = output.sum()
+        gradients = torch.autograd.grad(target_class, activations)[0]
+        activations = activations.detach()
+        
+        alpha_num = gradients.pow(2)
+        alpha_denom = 2 * gradients.pow(2) + (activations * gradients.pow(3)).sum(dim=(2, 3), keepdim=True)
+        alpha_denom = torch.where(alpha_denom != 0, alpha_denom, torch.ones_like(alpha_denom))
+        alphas = alpha_num / alpha_denom
+        
+        weights = (alphas * torch.relu(gradients)).sum(dim=(2, 3), keepdim=True)
+        cam = (weights * activations).sum(dim=1, keepdim=True)
+        cam = torch.relu(cam)
+        # Normalize each sample of the batch independently
+        cam = cam - cam.amin(dim=(1, 2, 3), keepdim=True)
+        cam_max = cam.amax(dim=(1, 2, 3), keepdim=True)
+        cam = cam / torch.where(cam_max > 0, cam_max, torch.ones_like(cam_max))
+        
+        return cam
+
+
+def warmup_model(model, device):
+    """Run one forward/backward pass so the first real request is not slow"""
+    dummy = torch.zeros(1, 3, INPUT_SIZE, INPUT_SIZE, device=device)
+    with torch.no_grad():
+        model(dummy)
+    # Grad-CAM++ path needs autograd buffers as well
+    with torch.enable_grad():
+        torch.autograd.grad(model(dummy).sum(), next(model.parameters()))
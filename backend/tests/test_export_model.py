@@ -0,0 +1,155 @@
+import json
+import time
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip('torch')
+# Parity grades risk levels with pipeline.assess_risk, which needs OpenCV
+pytest.importorskip('cv2')
+
+import export_model  # noqa: E402
+from export_model import ARTIFACT_NAMES, cache_key, publish  # noqa: E402
+
+
+class Export:
+    """Runs export_model.main() on a small reference model with stub
+    exporters and runtimes; each runtime adds `offsets[fmt]` to the
+    reference probability and sleeps `delays[fmt]` seconds per call"""
+
+    def __init__(self, tmp_path, monkeypatch):
+        self.cache_dir = tmp_path / 'cache'
+        self.assets_dir = tmp_path / 'assets'
+        self.exported = []
+        self.offsets = {}
+        self.delays = {}
+        self.missing_runtimes = set()
+
+        torch.manual_seed(0)
+        self.reference = torch.nn.Sequential(
+            torch.nn.AdaptiveAvgPool2d(1), torch.nn.Flatten(),
+            torch.nn.Linear(3, 1), torch.nn.Sigmoid()
+        ).eval()
+        checkpoint = tmp_path / 'model.safetensors'
+        checkpoint.write_bytes(b'weights')
+
+        rng = np.random.default_rng(0)
+        images = [rng.random((1, 3, 16, 16), dtype=np.float32) for _ in range(4)]
+        monkeypatch.setattr(export_model, 'load_reference',
+                            lambda *args: (self.reference, checkpoint))
+        monkeypatch.setattr(export_model, 'parity_images', lambda *args: images)
+        monkeypatch.setattr(export_model, 'load_runner', self.runner)
+        for fmt in ('ptl', 'onnx'):
+            monkeypatch.setattr(export_model, f'_export_{fmt}', self.exporter(fmt))
+
+    def exporter(self, fmt):
+        def export(model, example, output_path, options):
+            self.exported.append(fmt)
+            output_path.write_bytes(f'{fmt} {options}'.encode())
+        return export
+
+    def runner(self, fmt, path):
+        if fmt in self.missing_runtimes:
+            raise ImportError(f'No module named {fmt}runtime')
+
+        def run(batch):
+            time.sleep(self.delays.get(fmt, 0))
+            output = self.reference(torch.from_numpy(batch)).numpy().reshape(-1)
+            return output + self.offsets.get(fmt, 0.0)
+        return run
+
+    def __call__(self, *args, formats='ptl,onnx'):
+        self.exported.clear()
+        success = export_model.main([
+            '--formats', formats, '--repeats', '3',
+            '--cache-dir', str(self.cache_dir), '--assets-dir', str(self.assets_dir),
+            *args
+        ])
+        report = json.loads((self.cache_dir / 'report.json').read_text())
+        return success, report
+
+    def published(self):
+        if not self.assets_dir.exists():
+            return set()
+        return {path.name for path in self.assets_dir.iterdir()}
+
+
+@pytest.fixture
+def export(tmp_path, monkeypatch):
+    return Export(tmp_path, monkeypatch)
+
+
+def test_cache_key_tracks_checkpoint_options_and_revision(monkeypatch):
+    key = cache_key('a' * 64, 'onnx', {'opset': 13})
+    assert key == cache_key('a' * 64, 'onnx', {'opset': 13})
+    assert key != cache_key('b' * 64, 'onnx', {'opset': 13})
+    assert key != cache_key('a' * 64, 'onnx', {'opset': 17})
+    assert key != cache_key('a' * 64, 'tflite', {'opset': 13})
+    monkeypatch.setattr(export_model, 'EXPORTER_REVISION', export_model.EXPORTER_REVISION + 1)
+    assert key != cache_key('a' * 64, 'onnx', {'opset': 13})
+
+
+def test_cached_artifacts_reused_and_incomplete_entries_rebuilt(export):
+    success, _ = export()
+    assert success and export.exported == ['ptl', 'onnx']
+
+    success, report = export()
+    assert success and export.exported == []
+    assert all(artifact['cached'] for artifact in report['artifacts'].values())
+
+    # An export interrupted before its manifest was written
+    onnx_dir = export.cache_dir / f"onnx-{report['artifacts']['onnx']['key']}"
+    (onnx_dir / 'manifest.json').unlink()
+    success, report = export()
+    assert success and export.exported == ['onnx']
+    assert report['artifacts']['onnx']['cached'] is False
+
+    # Different options are a different cache entry
+    export('--opset', '17')
+    assert export.exported == ['onnx']
+
+
+def test_recommended_is_fastest_passing_format(export):
+    export.delays = {'ptl': 0.005}
+    success, report = export()
+    assert success and report['errors'] == {}
+    assert report['recommended'] == 'onnx'
+    assert export.published() == {ARTIFACT_NAMES['ptl'], ARTIFACT_NAMES['onnx']}
+
+
+def test_parity_failure_not_published_and_fails_run(export):
+    # The faster format disagrees with PyTorch
+    export.offsets = {'ptl': 0.01}
+    success, report = export()
+    assert success is False
+    assert report['parity']['ptl']['passes'] is False
+    assert report['errors']['ptl'].startswith('failed parity')
+    assert report['recommended'] == 'onnx'
+    assert export.published() == {ARTIFACT_NAMES['onnx']}
+
+
+def test_missing_runtime_fails_run(export):
+    export.missing_runtimes = {'onnx'}
+    success, report = export()
+    assert success is False
+    assert 'onnxruntime' in report['errors']['onnx']
+    assert export.published() == {ARTIFACT_NAMES['ptl']}
+
+
+def test_publish_skips_identical_files(tmp_path, monkeypatch):
+    artifact = tmp_path / 'cache' / 'tb_detector.onnx'
+    artifact.parent.mkdir()
+    artifact.write_bytes(b'v1')
+    assets = tmp_path / 'assets'
+    target = publish(artifact, assets)
+    assert target.read_bytes() == b'v1'
+
+    def no_copy(*args):
+        raise AssertionError('identical artifact copied again')
+    monkeypatch.setattr(export_model.shutil, 'copyfile', no_copy)
+    assert publish(artifact, assets) == target
+
+    monkeypatch.undo()
+    artifact.write_bytes(b'v2')
+    assert publish(artifact, assets).read_bytes() == b'v2'
+    assert sorted(p.name for p in assets.iterdir()) == ['tb_detector.onnx']
@@ -0,0 +1,95 @@
+import os
+
+import pytest
+
+import model_registry
+from model_registry import DEFAULT_VERSION, ModelRegistry
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    monkeypatch.delenv('DRISHTI_MODEL_VERSION', raising=False)
+    monkeypatch.setattr(model_registry, 'LEGACY_CHECKPOINT', tmp_path / 'missing.pt')
+    return ModelRegistry(tmp_path / 'registry')
+
+
+def add(registry, version, mtime):
+    """Placeholder weights file; only names and mtimes matter to ordering"""
+    registry.root.mkdir(parents=True, exist_ok=True)
+    path = registry.path_for(version)
+    path.write_bytes(b'weights')
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+@pytest.mark.parametrize('version', [
+    '../escape', 'a/b', '.hidden', '', 'v1 ', 'v1\n', None, 3,
+])
+def test_path_for_rejects_invalid_versions(registry, version):
+    with pytest.raises(ValueError):
+        registry.path_for(version)
+
+
+def test_path_for_stays_inside_registry(registry):
+    path = registry.path_for('v4_512.1-rc')
+    assert path.parent == registry.root and path.name == 'v4_512.1-rc.safetensors'
+
+
+def test_versions_sorted_by_name(registry):
+    assert registry.versions() == []
+    add(registry, 'b', 2000)
+    add(registry, 'a', 1000)
+    (registry.root / 'notes.txt').write_text('ignored')
+    assert [e['version'] for e in registry.versions()] == ['a', 'b']
+
+
+def test_default_version_order(registry, monkeypatch):
+    add(registry, 'older', 1_000_000)
+    add(registry, 'newest', 3_000_000)
+    assert registry.default_version() == 'newest'
+
+    # The v3 model wins over newer versions...
+    add(registry, DEFAULT_VERSION, 2_000_000)
+    assert registry.default_version() == DEFAULT_VERSION
+
+    # ...the activated version wins over the v3 model...
+    registry.set_active('older')
+    assert registry.default_version() == 'older'
+
+    # ...and the environment wins over everything
+    monkeypatch.setenv('DRISHTI_MODEL_VERSION', 'pinned')
+    assert registry.default_version() == 'pinned'
+
+
+def test_stale_active_pointer_ignored(registry):
+    add(registry, DEFAULT_VERSION, 1_000_000)
+    path = add(registry, 'removed', 2_000_000)
+    registry.set_active('removed')
+    path.unlink()
+    assert registry.active_version() is None
+    assert registry.default_version() == DEFAULT_VERSION
+
+
+def test_set_active_is_atomic_and_validated(registry):
+    with pytest.raises(ValueError):
+        registry.set_active('../escape')
+    registry.set_active('v4')
+    assert (registry.root / 'ACTIVE').read_text() == 'v4\n'
+    assert not (registry.root / 'ACTIVE.tmp').exists()
+
+
+def test_empty_registry_imports_legacy_checkpoint(registry, tmp_path, monkeypatch):
+    legacy = tmp_path / 'best_model.pt'
+    legacy.write_bytes(b'checkpoint')
+    monkeypatch.setattr(model_registry, 'LEGACY_CHECKPOINT', legacy)
+
+    imported = []
+    monkeypatch.setattr(registry, 'import_checkpoint',
+                        lambda path, version: imported.append((path, version)))
+    assert registry.default_version() == DEFAULT_VERSION
+    assert imported == [(legacy, DEFAULT_VERSION)]
+
+
+def test_empty_registry_without_legacy_checkpoint(registry):
+    with pytest.raises(FileNotFoundError, match='model_registry.py import'):
+        registry.default_version()
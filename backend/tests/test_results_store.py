@@ -0,0 +1,154 @@
+import sqlite3
+import threading
+
+import pytest
+
+from results_store import ResultsStore, RISK_LEVELS
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultsStore(tmp_path / "results.db", flush_interval=0.01)
+    yield store
+    store.close()
+
+
+def result(risk_level='low'):
+    return {
+        'probability': {'low': 0.1, 'medium': 0.5, 'high': 0.9}[risk_level],
+        'riskLevel': risk_level,
+        'classification': 'TB Positive' if risk_level == 'high' else 'TB Negative',
+        'urgency_level': 'routine',
+        'affected_regions': ['right upper lobe'] if risk_level == 'high' else [],
+        'model_version': 'test',
+    }
+
+
+def fill(store, count):
+    """Rows with known risk, clinic and created_at; several share a timestamp"""
+    expected = []
+    for i in range(count):
+        risk_level = RISK_LEVELS[i % 3]
+        clinic_id = f'clinic-{i % 2}'
+        store.record(result(risk_level), f'{i:064x}', clinic_id=clinic_id)
+        expected.append((1000.0 + i // 4, risk_level, clinic_id))
+    store.flush()
+    conn = sqlite3.connect(str(store.db_path))
+    with conn:
+        for row_id, (created_at, _, _) in enumerate(expected, start=1):
+            conn.execute("UPDATE results SET created_at = ? WHERE id = ?", (created_at, row_id))
+    conn.close()
+    return {row_id: row for row_id, row in enumerate(expected, start=1)}
+
+
+def newest_first(rows):
+    return sorted(rows, key=lambda row_id: (rows[row_id][0], row_id), reverse=True)
+
+
+def all_pages(store, **filters):
+    ids, cursor = [], None
+    while True:
+        page, cursor = store.query(cursor=cursor, **filters)
+        ids.extend(row['id'] for row in page)
+        if cursor is None:
+            return ids
+
+
+def test_cursor_pages_have_no_gaps_or_duplicates(store):
+    rows = fill(store, 37)
+    # Page boundaries fall inside groups of equal created_at
+    ids = all_pages(store, limit=3)
+    assert ids == newest_first(rows)
+
+
+def test_combined_filters(store):
+    rows = fill(store, 60)
+    ids = all_pages(store, risk_level='high', clinic_id='clinic-1',
+                    start=1003.0, end=1012.0, limit=2)
+    expected = {
+        row_id: row for row_id, row in rows.items()
+        if row[1] == 'high' and row[2] == 'clinic-1' and 1003.0 <= row[0] < 1012.0
+    }
+    assert expected and ids == newest_first(expected)
+
+    page, _ = store.query(image_sha256=f'{6:064x}')
+    assert [row['id'] for row in page] == [7]
+    assert page[0]['affected_regions'] == []
+
+
+@pytest.mark.parametrize('filters', [
+    {'cursor': 'not-a-cursor'},
+    {'cursor': 'abc:1'},
+    {'limit': 'many'},
+    {'risk_level': 'extreme'},
+])
+def test_invalid_query_rejected(store, filters):
+    with pytest.raises(ValueError):
+        store.query(**filters)
+
+
+def test_limit_clamped(store):
+    fill(store, 5)
+    page, cursor = store.query(limit=0)
+    assert len(page) == 1 and cursor is not None
+
+
+def test_queries_from_new_threads_reuse_connections(store, monkeypatch):
+    fill(store, 10)
+    opened = []
+    connect = store._connect
+    monkeypatch.setattr(store, '_connect', lambda **kwargs: opened.append(1) or connect(**kwargs))
+
+    def query_in_new_threads(count):
+        """`count` concurrent queries, each on its own new thread like the
+        threaded server's requests; returns any errors raised"""
+        errors = []
+        def run():
+            try:
+                assert len(store.query(limit=5)[0]) == 5
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=run) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return errors
+
+    for _ in range(20):
+        assert query_in_new_threads(1) == []
+    assert len(opened) == 1
+
+    # Concurrent queries open what they need; only max_idle_readers are kept
+    assert query_in_new_threads(16) == []
+    assert store._readers.qsize() <= 4
+
+
+def test_dropped_over_byte_budget(tmp_path):
+    store = ResultsStore(tmp_path / "results.db", max_queue_bytes=1500)
+    try:
+        # 1 KB per row plus the PNG does not fit, the row alone does
+        assert store.record(result('high'), '0' * 64, heatmap_png=b'x' * 1000) is False
+        assert store.record(result('low'), '1' * 64) is True
+        store.flush()
+        assert store.stats['dropped'] == 1
+        assert store.stats['written'] == 1
+    finally:
+        store.close()
+
+
+def test_close_commits_everything_queued(tmp_path):
+    # A flush interval this long means nothing is written before close()
+    store = ResultsStore(tmp_path / "results.db", batch_size=1000, flush_interval=60)
+    for i in range(50):
+        store.record(result('high'), f'{i:064x}', heatmap_png=b'png', overlay_png=bytes([i]))
+    store.close()
+    store.close()
+
+    conn = sqlite3.connect(str(tmp_path / "results.db"))
+    assert conn.execute("SELECT COUNT(*) FROM results").fetchone()[0] == 50
+    digests = [row[0] for row in conn.execute("SELECT DISTINCT heatmap_sha256 FROM results")]
+    conn.close()
+    # Identical heatmaps are stored once
+    assert len(digests) == 1 and store.heatmap_path(digests[0]).read_bytes() == b'png'
+    assert store.status()['queued_bytes'] == 0
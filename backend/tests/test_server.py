@@ -0,0 +1,269 @@
+import gc
+import subprocess
+import sys
+import time
+import types
+import weakref
+from pathlib import Path
+
+import pytest
+
+import server
+from model_registry import ModelRegistry
+from results_store import ResultsStore
+
+ADMIN = {'X-Admin-Token': 'admin-secret'}
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def fake_model(name):
+    """Stands in for TBClassifier: _hot_swap only reaches for the CAM layer"""
+    return types.SimpleNamespace(name=name, backbone=types.SimpleNamespace(features=[None]))
+
+
+@pytest.fixture
+def app_state(tmp_path, monkeypatch):
+    """A ready in-process server on a temporary registry serving 'v1'"""
+    registry = ModelRegistry(tmp_path / 'registry')
+    registry.root.mkdir()
+    for version in ('v1', 'v2'):
+        registry.path_for(version).write_bytes(b'weights')
+    monkeypatch.setattr(registry, 'load', lambda version, device: fake_model(version))
+    # Grad-CAM++ and the warm-up need torch, which these tests never load
+    monkeypatch.setitem(sys.modules, 'tb_model', types.SimpleNamespace(
+        GradCAMPlusPlus=lambda model, layer: ('cam', model.name),
+        warmup_model=lambda model, device: None,
+    ))
+
+    monkeypatch.setattr(server, 'registry', registry)
+    monkeypatch.setattr(server, 'ADMIN_TOKEN', 'admin-secret')
+    monkeypatch.setattr(server, 'inference_ring', None)
+    monkeypatch.setattr(server, '_startup', {'status': 'ready', 'error': None, 'timings': {}})
+    monkeypatch.setattr(server, '_swap_state', {'status': 'idle', 'version': None, 'error': None})
+    monkeypatch.setattr(server, 'model', fake_model('v1'))
+    monkeypatch.setattr(server, 'model_cam', ('cam', 'v1'))
+    monkeypatch.setattr(server, 'model_version', 'v1')
+    return registry
+
+
+@pytest.fixture
+def client(app_state):
+    return server.app.test_client()
+
+
+def wait_for_swap(timeout=5):
+    deadline = time.monotonic() + timeout
+    while server._swap_state['status'] in ('loading', 'warming'):
+        assert time.monotonic() < deadline, 'hot-swap did not finish'
+        time.sleep(0.01)
+    return dict(server._swap_state)
+
+
+def test_admin_token_required(client):
+    assert client.get('/admin/models').status_code == 403
+    assert client.get('/admin/models', headers={'X-Admin-Token': 'wrong'}).status_code == 403
+    response = client.post('/admin/models/activate', json={'version': 'v2'},
+                           headers={'X-Admin-Token': ''})
+    assert response.status_code == 403
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'data': 'v2'},
+    {'json': ['v2']},
+    {'json': {}},
+    {'json': {'version': 7}},
+    {'json': {'version': '../v2'}},
+])
+def test_activate_rejects_malformed_requests(client, kwargs):
+    response = client.post('/admin/models/activate', headers=ADMIN, **kwargs)
+    assert response.status_code == 400
+
+
+def test_activate_unknown_version(client):
+    response = client.post('/admin/models/activate', json={'version': 'v9'}, headers=ADMIN)
+    assert response.status_code == 404
+
+
+def test_activate_while_swapping(client):
+    server._swap_state.update(status='warming', version='v1')
+    response = client.post('/admin/models/activate', json={'version': 'v2'}, headers=ADMIN)
+    assert response.status_code == 409
+
+
+def test_activate_swaps_and_persists(client, app_state):
+    response = client.post('/admin/models/activate', json={'version': 'v2'}, headers=ADMIN)
+    assert response.status_code == 202
+    assert wait_for_swap() == {'status': 'idle', 'version': 'v2', 'error': None}
+
+    listing = client.get('/admin/models', headers=ADMIN).get_json()
+    assert listing['active'] == 'v2'
+    # A restart starts from the activated version
+    assert ModelRegistry(app_state.root).default_version() == 'v2'
+
+
+def test_in_flight_request_keeps_its_model(app_state):
+    pinned_model, pinned_cam, pinned_version = server.get_active_model()
+    server._hot_swap('v2')
+
+    assert (pinned_model.name, pinned_cam, pinned_version) == ('v1', ('cam', 'v1'), 'v1')
+    active_model, active_cam, active_version = server.get_active_model()
+    assert (active_model.name, active_cam, active_version) == ('v2', ('cam', 'v2'), 'v2')
+
+
+def test_failed_swap_keeps_serving(app_state, monkeypatch):
+    def broken(version, device):
+        raise RuntimeError('corrupt weights')
+    monkeypatch.setattr(app_state, 'load', broken)
+    server._hot_swap('v2')
+
+    assert server._swap_state['status'] == 'failed'
+    assert server.get_active_model()[2] == 'v1'
+    assert app_state.active_version() is None
+
+
+def test_swapped_out_model_is_freed(app_state, monkeypatch):
+    pytest.importorskip('torch')
+    monkeypatch.delitem(sys.modules, 'tb_model')
+    import tb_model
+    monkeypatch.setattr(tb_model, 'warmup_model', lambda model, device: None)
+
+    def build(version, device):
+        return tb_model.TBClassifier(pretrained=False).eval()
+    monkeypatch.setattr(app_state, 'load', build)
+    previous = build('v1', None)
+    monkeypatch.setattr(server, 'model', previous)
+    monkeypatch.setattr(server, 'model_cam',
+                        tb_model.GradCAMPlusPlus(previous, previous.backbone.features[-1]))
+    previous_ref = weakref.ref(previous)
+    del previous
+
+    # Freed by reference counting alone, not whenever the cyclic GC runs
+    gc.disable()
+    try:
+        server._hot_swap('v2')
+        assert server._swap_state['status'] == 'idle'
+        assert previous_ref() is None
+    finally:
+        gc.enable()
+
+
+@pytest.fixture
+def starting(monkeypatch):
+    """In-process server before the background load has finished"""
+    state = {'status': 'starting', 'error': None, 'timings': {'server_import_seconds': 0.1}}
+    monkeypatch.setattr(server, '_startup', state)
+    monkeypatch.setattr(server, 'inference_ring', None)
+    monkeypatch.setattr(server, '_results_store', None)
+    monkeypatch.setattr(server, '_results_error', None)
+    monkeypatch.setattr(server, 'model_version', None)
+    monkeypatch.setattr(server, 'device', None)
+    return state
+
+
+@pytest.mark.parametrize('phase', ['starting', 'loading', 'warming'])
+def test_health_reports_phase_until_ready(starting, phase):
+    starting['status'] = phase
+    client = server.app.test_client()
+
+    response = client.get('/health')
+    assert response.status_code == 503
+    body = response.get_json()
+    assert body['status'] == phase and body['model_loaded'] is False
+    # The process is fine, only the model is not ready yet
+    assert client.get('/health/live').status_code == 200
+
+
+def test_health_ready_with_timings(starting, monkeypatch):
+    starting.update(status='ready', timings={
+        'import_seconds': 1.5, 'load_seconds': 0.4, 'warmup_seconds': 0.9, 'ready_seconds': 3.2
+    })
+    monkeypatch.setattr(server, 'model_version', 'v1')
+
+    response = server.app.test_client().get('/health')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['status'] == 'ready' and body['model_loaded'] is True
+    assert body['model_version'] == 'v1'
+    assert body['timings']['ready_seconds'] == 3.2
+
+
+@pytest.mark.parametrize('method, path, status', [
+    ('POST', '/predict', 503),
+    ('GET', '/admin/models', 503),
+    ('POST', '/admin/models/activate', 503),
+    # A wrong probe path or URL is a 404, not "still loading"
+    ('GET', '/nope', 404),
+])
+def test_requests_gated_until_ready(starting, method, path, status):
+    starting['status'] = 'warming'
+    response = server.app.test_client().open(path, method=method)
+    assert response.status_code == status
+    if status == 503:
+        assert response.headers['Retry-After'] == '5'
+        assert response.get_json() == {'error': 'Model is not ready yet', 'status': 'warming'}
+
+
+def test_cors_preflight_not_gated(starting):
+    response = server.app.test_client().options('/predict', headers={
+        'Origin': 'http://localhost', 'Access-Control-Request-Method': 'POST'
+    })
+    assert response.status_code == 200
+
+
+def test_failed_load_fails_liveness(starting, monkeypatch):
+    def broken_load():
+        starting['status'] = 'loading'
+        raise FileNotFoundError('No models in registry')
+    monkeypatch.setattr(server, 'load_model', broken_load)
+    server._background_load()
+    client = server.app.test_client()
+
+    response = client.get('/health/live')
+    assert response.status_code == 503
+    assert response.get_json() == {'status': 'failed', 'error': 'No models in registry'}
+
+    response = client.get('/health')
+    assert response.status_code == 503
+    assert response.get_json()['error'] == 'No models in registry'
+    assert client.post('/predict').status_code == 503
+
+
+@pytest.mark.parametrize('phase', ['loading', 'failed'])
+def test_history_served_without_a_model(starting, tmp_path, monkeypatch, phase):
+    starting['status'] = phase
+    store = ResultsStore(tmp_path / 'results.db', flush_interval=0.01)
+    monkeypatch.setattr(server, '_results_store', store)
+    monkeypatch.setattr(server, 'RESULTS_TOKEN', 'results-secret')
+    monkeypatch.setattr(server, 'ADMIN_TOKEN', None)
+    try:
+        store.record({
+            'probability': 0.9, 'riskLevel': 'high', 'classification': 'TB Positive',
+            'urgency_level': 'urgent', 'affected_regions': [], 'model_version': 'v1',
+        }, 'a' * 64, heatmap_png=b'png', overlay_png=b'overlay')
+        store.flush()
+        client = server.app.test_client()
+
+        assert client.get('/results').status_code == 403
+        wrong = {'X-Results-Token': 'results-secreT'}
+        assert client.get('/results', headers=wrong).status_code == 403
+
+        token = {'X-Results-Token': 'results-secret'}
+        response = client.get('/results', headers=token)
+        assert response.status_code == 200
+        [row] = response.get_json()['results']
+        assert row['risk_level'] == 'high'
+
+        response = client.get(row['heatmap_url'], headers=token)
+        assert response.status_code == 200 and response.data == b'png'
+    finally:
+        store.close()
+
+
+def test_import_stays_light():
+    """The port is bound right after `import server`; the heavy stack is
+    left to the background loader"""
+    code = ("import sys, server; "
+            "print(sorted(m for m in ('torch', 'cv2', 'numpy') if m in sys.modules))")
+    output = subprocess.run([sys.executable, '-c', code], cwd=str(BACKEND_DIR),
+                            capture_output=True, text=True, check=True).stdout
+    assert output.strip().splitlines()[-1] == '[]'
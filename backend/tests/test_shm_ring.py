@@ -0,0 +1,108 @@
+import threading
+
+import numpy as np
+import pytest
+
+from shm_ring import CLAIMED, FREE, STATE, RingSession, TensorRing
+
+
+@pytest.fixture
+def ring():
+    ring = TensorRing(slots=3)
+    yield ring
+    ring.close(unlink=True)
+
+
+def fake_owner(ring, batches, fail=False):
+    """Stands in for inference_worker: probability = mean of the input"""
+    def loop():
+        while not ring.stop.is_set():
+            indices = ring.claim_batch(max_batch=8, window=0.01, poll=0.05)
+            if len(indices) == 0:
+                continue
+            batches.append(list(indices))
+            ring.probs[indices] = ring.inputs[indices].mean(axis=(1, 2, 3))
+            ring.complete(indices, failed=fail)
+    thread = threading.Thread(target=loop, daemon=True)
+    thread.start()
+    return thread
+
+
+def image(value):
+    return np.full((512, 512, 3), value, dtype=np.float32)
+
+
+def test_round_trip(ring):
+    batches = []
+    owner = fake_owner(ring, batches)
+    with RingSession(ring, image(0.25)) as session:
+        assert session.probability() == pytest.approx(0.25)
+        assert session.cam().shape == (16, 16)
+    ring.stop.set()
+    owner.join()
+    assert (ring.header[:, STATE] == FREE).all()
+
+
+def test_claim_batch_is_fifo_and_bounded(ring):
+    slots = [ring.acquire(timeout=1) for _ in range(3)]
+    for slot in (slots[2], slots[0], slots[1]):
+        ring._submit(slot.index, want_cam=False)
+
+    first = ring.claim_batch(max_batch=2, window=0.01)
+    assert list(first) == [slots[2].index, slots[0].index]
+    assert (ring.header[first, STATE] == CLAIMED).all()
+    assert list(ring.claim_batch(max_batch=2, window=0.01)) == [slots[1].index]
+    assert list(ring.claim_batch(max_batch=2, window=0.01, poll=0.01)) == []
+
+
+def test_acquire_times_out_when_full(ring):
+    slots = [ring.acquire(timeout=1) for _ in range(3)]
+    with pytest.raises(TimeoutError):
+        ring.acquire(timeout=0.05)
+    slots[0].release()
+    ring.acquire(timeout=1).release()
+
+
+def test_abandoned_slot_is_recycled_by_owner(ring):
+    slot = ring.acquire(timeout=1)
+    with pytest.raises(TimeoutError):
+        slot.run(timeout=0.05)
+    # The owner still holds the request, so the front-end must not free it
+    slot.release()
+    assert ring.header[slot.index, STATE] != FREE
+    held = [ring.acquire(timeout=1) for _ in range(2)]
+    with pytest.raises(TimeoutError):
+        ring.acquire(timeout=0.05)
+
+    indices = ring.claim_batch(max_batch=8, window=0.01)
+    assert list(indices) == [slot.index]
+    ring.complete(indices)
+    assert ring.header[slot.index, STATE] == FREE
+    ring.acquire(timeout=1).release()
+    for other in held:
+        other.release()
+
+
+def test_failed_batch_raises(ring):
+    owner = fake_owner(ring, [], fail=True)
+    with RingSession(ring, image(0.5)) as session:
+        with pytest.raises(RuntimeError):
+            session.probability()
+    ring.stop.set()
+    owner.join()
+
+
+def test_startup_phase_shared_with_forked_process(ring):
+    import multiprocessing as mp
+
+    def owner():
+        ring.set_phase('warming', import_seconds=1.5, load_seconds=0.25)
+        ring.fail(RuntimeError("warm-up failed"))
+
+    assert ring.phase() == 'starting' and ring.timings() == {}
+    process = mp.get_context('fork').Process(target=owner)
+    process.start()
+    process.join()
+    assert ring.phase() == 'failed'
+    assert ring.error() == "warm-up failed"
+    assert ring.timings() == {'import_seconds': 1.5, 'load_seconds': 0.25}
@@ -0,0 +1,87 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image, ImageFile
+
+import uploads
+from uploads import UploadRejected, open_xray
+
+
+def encoded(size, fmt, mode='L'):
+    rng = np.random.default_rng(0)
+    shape = size[::-1] if mode == 'L' else size[::-1] + (3,)
+    img = Image.fromarray(rng.integers(0, 256, shape, dtype=np.uint8), mode)
+    buffer = io.BytesIO()
+    img.save(buffer, format=fmt)
+    buffer.seek(0)
+    return buffer
+
+
+def test_pixel_limit_rejected_from_header(monkeypatch):
+    monkeypatch.setattr(uploads, 'MAX_IMAGE_PIXELS', 150 * 150 - 1)
+
+    def no_decode(self):
+        raise AssertionError("pixel data decoded")
+    monkeypatch.setattr(ImageFile.ImageFile, 'load', no_decode)
+
+    with pytest.raises(UploadRejected) as e:
+        open_xray(encoded((150, 150), 'PNG'))
+    assert e.value.status == 413
+
+
+def test_decompression_bomb_rejected(monkeypatch):
+    # PIL's own guard fires while opening at twice its limit
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 100 * 100)
+    with pytest.raises(UploadRejected) as e:
+        open_xray(encoded((300, 300), 'PNG'))
+    assert e.value.status == 413
+
+
+def test_pil_limit_left_alone():
+    limit = Image.MAX_IMAGE_PIXELS
+    open_xray(encoded((512, 512), 'PNG'))
+    assert Image.MAX_IMAGE_PIXELS == limit
+
+
+def test_tiny_image_rejected():
+    with pytest.raises(UploadRejected) as e:
+        open_xray(encoded((63, 512), 'PNG'))
+    assert e.value.status == 400
+
+
+@pytest.mark.parametrize('data', [
+    b'not an image at all' * 100,
+    encoded((512, 512), 'JPEG').getvalue()[:2000],
+])
+def test_corrupt_file_rejected(data):
+    with pytest.raises(UploadRejected) as e:
+        open_xray(io.BytesIO(data))
+    assert e.value.status == 400
+
+
+def test_large_jpeg_decoded_in_draft_mode():
+    img, original_size = open_xray(encoded((2048, 2048), 'JPEG'))
+    assert original_size == (2048, 2048)
+    # DCT scaling by 1/4 lands exactly on the model input size
+    assert img.size == (512, 512)
+    assert img.mode == 'L'
+
+
+def test_large_jpeg_never_drafted_below_input_size():
+    img, _ = open_xray(encoded((2000, 1800), 'JPEG', mode='RGB'))
+    assert min(img.size) >= 512
+    assert img.size == (1000, 900)
+    assert img.mode == 'RGB'
+
+
+def test_large_png_shrunk_by_reduce():
+    img, original_size = open_xray(encoded((1600, 2100), 'PNG'))
+    assert original_size == (1600, 2100)
+    # min(1600 // 512, 2100 // 512) = 3
+    assert img.size == (534, 700)
+
+
+def test_small_png_kept_at_full_size():
+    img, _ = open_xray(encoded((900, 700), 'PNG'))
+    assert img.size == (900, 700)
@@ -0,0 +1,90 @@
+"""
+Bounded X-ray upload handling
+Uploads are read from the stream Werkzeug already spools to disk (past
+500 KB) instead of being copied into memory, images are inspected from
+their header before any pixel data is decoded, and JPEGs are decoded
+straight at (close to) model resolution.
+Peak memory per request is therefore bounded by the limits below, not by
+whatever film the client sends.
+"""
+
+import hashlib
+import os
+
+from model_constants import INPUT_SIZE
+
+MAX_UPLOAD_BYTES = int(float(os.environ.get('DRISHTI_MAX_UPLOAD_MB', 25)) * 1024 * 1024)
+# Large digital radiographs are ~4300x4300 (18.5MP); anything far beyond is a bomb
+MAX_IMAGE_PIXELS = int(os.environ.get('DRISHTI_MAX_IMAGE_PIXELS', 40_000_000))
+
+
+class UploadRejected(ValueError):
+    """Upload refused before decoding; `status` is the HTTP status to return"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def stream_sha256(stream):
+    """Hash an upload in chunks and rewind it for decoding"""
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(1024 * 1024), b''):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def open_xray(stream):
+    """Returns (image, original_size) decoded no larger than needed.
+
+    The image keeps its source mode (usually 'L' for X-rays); converting
+    to RGB after the resize is three times cheaper than before it.
+    """
+    from PIL import Image
+
+    # PIL's process-wide Image.MAX_IMAGE_PIXELS is left alone; the header
+    # check below enforces our limit, PIL's own guard only sees far larger files
+    try:
+        img = Image.open(stream)
+    except Image.DecompressionBombError as e:
+        raise UploadRejected(str(e), status=413) from e
+    except Exception as e:
+        raise UploadRejected("Unsupported or corrupt image file") from e
+
+    # Header-only checks: nothing but the header has been read so far
+    original_size = img.size
+    width, height = original_size
+    if width * height > MAX_IMAGE_PIXELS:
+        img.close()
+        raise UploadRejected(
+            f"Image is {width}x{height}, limit is {MAX_IMAGE_PIXELS:,} pixels",
+            status=413
+        )
+    if width < 64 or height < 64:
+        img.close()
+        raise UploadRejected(f"Image is too small ({width}x{height})")
+
+    # JPEG: let the decoder scale by 1/2, 1/4 or 1/8 in the DCT domain,
+    # never below the model input size
+    if img.format in ('JPEG', 'MPO'):
+        img.draft(img.mode if img.mode in ('L', 'RGB') else 'RGB', (INPUT_SIZE, INPUT_SIZE))
+
+    try:
+        img.load()
+    except Image.DecompressionBombError as e:
+        raise UploadRejected(str(e), status=413) from e
+    except OSError as e:
+        raise UploadRejected("Unsupported or corrupt image file") from e
+
+    if img.mode not in ('L', 'RGB'):
+        img = img.convert('RGB')
+
+    # Other formats decode at full size; shrink by an integer factor before
+    # the LANCZOS resize so it works on far fewer pixels
+    factor = min(img.width // INPUT_SIZE, img.height // INPUT_SIZE)
+    if factor >= 2:
+        img = img.reduce(factor)
+
+    return img, original_size